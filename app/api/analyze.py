@@ -1,86 +1,256 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException
+from fastapi import APIRouter, Request, HTTPException
+from starlette.concurrency import run_in_threadpool
+from python_multipart.multipart import MultipartParser, parse_options_header
+from python_multipart.exceptions import MultipartParseError
+import hashlib
 import os
 import uuid
 
 from app.models.analyze_req import DimensionCheckRequest, ColourDetectRequest
-from app.models.analyze_resp import (UploadAnalyzeResponse, DimensionCheckResponse, ColourDetectResponse)
+from app.models.analyze_resp import (UploadAnalyzeResponse, DimensionCheckResponse, ColourDetectResponse,
+                                     JobResponse)
 from app.pipeline.analyzer import PDFAnalyzer
+from app.pipeline.stage_cache import StageCache, remember_sha256
+from app.services.job_registry import JobRegistry, colour_key
+from app.config import (STAGE_CACHE_DIR, STAGE_CACHE_BYTES, MAX_UPLOAD_BYTES, UPLOAD_OVERHEAD_BYTES,
+                        UPLOAD_CHUNK_SIZE, JOB_DB_PATH)
+from typing import Optional
 
 router = APIRouter(prefix="/analyze", tags=["Analyze"])
+stages = StageCache(STAGE_CACHE_DIR, STAGE_CACHE_BYTES)
+registry = JobRegistry(JOB_DB_PATH)
 
 
 class DimensionCheckRequest_JSON(DimensionCheckRequest):
     job_id: str
-    upload_path: str
+    # Only needed for uploads made before the job registry
+    upload_path: Optional[str] = None
 
 class ColourDetectRequest_JSON(ColourDetectRequest):
     job_id: str
-    upload_path: str
+    upload_path: Optional[str] = None
 
 
-@router.post("/upload", response_model=UploadAnalyzeResponse)
-async def analyze_pdf(file: UploadFile = File(...)):
+def _job(job_id: str, upload_path: Optional[str] = None):
+    """The registered job, or 404"""
+    try:
+        job = registry.resolve(job_id, upload_path)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    if job is None or not os.path.exists(job["upload_path"]):
+        raise HTTPException(status_code=404, detail="Upload not found")
+    return job
+
+
+def _too_large():
+    return HTTPException(status_code=413, detail=f"PDF larger than {MAX_UPLOAD_BYTES} bytes")
+
+
+class _UploadPart:
     """
-    Upload PDF and get initial info: dimensions, layout
+    python_multipart callbacks that write the form's "file" part to disk as
+    it is parsed, hashing it on the way; other parts are ignored.
+    Raises 400 for a file that is not a PDF and 413 once it passes
+    MAX_UPLOAD_BYTES.
+    """
+
+    def __init__(self, buffer):
+        self.buffer = buffer
+        self.digest = hashlib.sha256()
+        self.size = 0
+        self.found = False
+        self.writing = False
+        self.complete = False
+        self.headers = {}
+        self.field = self.value = b""
+
+    def callbacks(self):
+        return {
+            "on_part_begin": self.on_part_begin,
+            "on_header_field": self.on_header_field,
+            "on_header_value": self.on_header_value,
+            "on_header_end": self.on_header_end,
+            "on_headers_finished": self.on_headers_finished,
+            "on_part_data": self.on_part_data,
+            "on_part_end": self.on_part_end,
+            "on_end": self.on_end
+        }
+
+    def on_part_begin(self):
+        self.headers = {}
+
+    def on_header_field(self, data, start, end):
+        self.field += data[start:end]
+
+    def on_header_value(self, data, start, end):
+        self.value += data[start:end]
+
+    def on_header_end(self):
+        self.headers[self.field.lower()] = self.value
+        self.field = self.value = b""
+
+    def on_headers_finished(self):
+        _, params = parse_options_header(self.headers.get(b"content-disposition", b""))
+        if params.get(b"name") != b"file" or self.found:
+            return
+
+        content_type, _ = parse_options_header(self.headers.get(b"content-type", b""))
+        if content_type != b"application/pdf":
+            raise HTTPException(status_code=400, detail="File must be a PDF")
+        self.found = self.writing = True
+
+    def on_part_data(self, data, start, end):
+        if not self.writing:
+            return
+        self.size += end - start
+        if self.size > MAX_UPLOAD_BYTES:
+            raise _too_large()
+        chunk = data[start:end]
+        self.digest.update(chunk)
+        self.buffer.write(chunk)
+
+    def on_part_end(self):
+        self.writing = False
+
+    def on_end(self):
+        self.complete = True
+
+
+async def _save_upload(request: Request, upload_dir: str):
+    """
+    Parse the multipart request body as it arrives and stream its "file"
+    part to disk in chunks, hashing it on the way. Nothing is spooled first,
+    so an oversized upload is refused as soon as it passes the limit, with
+    or without a Content-Length header.
+    The file is stored as {sha256}.pdf, so identical uploads share one file.
+    Returns (upload_path, sha256).
     """
-    if file.content_type != "application/pdf":
-        raise HTTPException(status_code=400, detail="File must be a PDF")
+    content_type, params = parse_options_header(request.headers.get("content-type", ""))
+    if content_type != b"multipart/form-data" or not params.get(b"boundary"):
+        raise HTTPException(status_code=400, detail="Expected a multipart/form-data upload")
 
+    tmp_path = os.path.join(upload_dir, f".upload-{uuid.uuid4().hex}")
+    received = 0
+
+    try:
+        with open(tmp_path, "wb") as buffer:
+            part = _UploadPart(buffer)
+            parser = MultipartParser(params[b"boundary"], part.callbacks())
+
+            # Parsing and writing run off the event loop, a chunk at a time
+            pending = bytearray()
+            async for data in request.stream():
+                received += len(data)
+                if received > MAX_UPLOAD_BYTES + UPLOAD_OVERHEAD_BYTES:
+                    raise _too_large()
+                pending += data
+                if len(pending) >= UPLOAD_CHUNK_SIZE:
+                    await run_in_threadpool(parser.write, bytes(pending))
+                    pending.clear()
+            await run_in_threadpool(parser.write, bytes(pending))
+            parser.finalize()
+
+        if not part.complete:
+            raise HTTPException(status_code=400, detail="Upload ended before the closing boundary")
+        if not part.found:
+            raise HTTPException(status_code=422, detail="No file part in the upload")
+
+        sha256 = part.digest.hexdigest()
+        upload_path = os.path.join(upload_dir, f"{sha256}.pdf")
+        if os.path.exists(upload_path):
+            # Same content already stored: keep that file, downstream caches already know it
+            os.remove(tmp_path)
+        else:
+            os.replace(tmp_path, upload_path)
+    except MultipartParseError as e:
+        os.remove(tmp_path)
+        raise HTTPException(status_code=400, detail=f"Malformed upload: {e}")
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    remember_sha256(upload_path, sha256)
+    return upload_path, sha256
+
+
+# The body is parsed by hand (see _save_upload), so its form is declared here for the docs
+UPLOAD_FORM = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "multipart/form-data": {
+                "schema": {
+                    "type": "object",
+                    "properties": {"file": {"type": "string", "format": "binary"}},
+                    "required": ["file"]
+                }
+            }
+        }
+    }
+}
+
+
+@router.post("/upload", response_model=UploadAnalyzeResponse, openapi_extra=UPLOAD_FORM)
+async def analyze_pdf(request: Request):
+    """
+    Upload PDF and get initial info: dimensions, layout
+    """
     upload_dir = "storage/uploads"
     os.makedirs(upload_dir, exist_ok=True)
 
     job_id = str(uuid.uuid4())[:8]
-    upload_path = os.path.join(upload_dir, f"{job_id}.pdf")
 
     try:
-        with open(upload_path, "wb") as buffer:
-            content = await file.read()
-            buffer.write(content)
+        upload_path, sha256 = await _save_upload(request, upload_dir)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"File save failed: {str(e)}")
 
     try:
-        # Use PDFAnalyzer pipeline to get dimensions
-        analysis = PDFAnalyzer.get_dimensions(upload_path)
+        # The PDF is read once here; later calls answer from the registry
+        job = registry.register(job_id, upload_path, sha256)
 
         return {
             "job_id": job_id,
             "upload_path": upload_path,
-            "width": analysis["width"],
-            "height": analysis["height"],
-            "layout": analysis["layout"],
-            "needs_rotation": analysis["needs_rotation"]
+            "sha256": sha256,
+            "page_count": job["page_count"],
+            "width": job["width"],
+            "height": job["height"],
+            "layout": job["layout"],
+            "needs_rotation": job["needs_rotation"]
         }
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.get("/jobs/{job_id}", response_model=JobResponse)
+async def get_job(job_id: str):
+    """
+    Everything known about an upload: metadata, fit per printer, colours, artifacts
+    """
+    return _job(job_id)
+
+
 @router.post("/check-dimensions", response_model=DimensionCheckResponse)
 async def check_dimensions(body: DimensionCheckRequest_JSON):
     """
     Check if PDF fits within printer dimensions, optionally with rotation
     """
     job_id = body.job_id
-    upload_path = body.upload_path
     printer = body.printer
     rotate = body.rotate
     
     if not job_id or not printer:
         raise HTTPException(status_code=400, detail="job_id and printer required")
 
-    if not os.path.exists(upload_path):
-        raise HTTPException(status_code=404, detail="Upload not found")
-
-    try:
-        # Use PDFAnalyzer pipeline to check dimensions
-        analysis = PDFAnalyzer.check_dimensions(upload_path, printer, rotate)
-        return analysis
-
-    except ValueError as e:
-        raise HTTPException(status_code=400, detail=str(e))
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    # Precomputed for every printer when the PDF was registered
+    job = _job(job_id, body.upload_path)
+    return job["fits"][printer]["rotated" if rotate else "upright"]
 
 @router.post("/detect-colours", response_model=ColourDetectResponse)
 async def detect_colours(body: ColourDetectRequest_JSON):
@@ -88,25 +258,35 @@ async def detect_colours(body: ColourDetectRequest_JSON):
     Detect colours in PDF (for multi-colour mode)
     """
     job_id = body.job_id
-    upload_path = body.upload_path
     
     if not job_id:
         raise HTTPException(status_code=400, detail="job_id required")
     
-    if not os.path.exists(upload_path):
-        raise HTTPException(status_code=404, detail="Upload not found")
+    job = _job(job_id, body.upload_path)
+    key = colour_key(body.max_colours, body.colour_merge_delta_e)
+    if key in job["colours"]:
+        return job["colours"][key]
 
     try:
         svg_path = os.path.join("storage/svgs", f"{job_id}_colours.svg")
         os.makedirs("storage/svgs", exist_ok=True)
 
         # Use PDFAnalyzer pipeline to detect colours
-        analysis = PDFAnalyzer.detect_colours(upload_path, svg_path)
+        analysis = PDFAnalyzer.detect_colours(
+            job["upload_path"],
+            svg_path,
+            max_colours=body.max_colours,
+            merge_delta_e=body.colour_merge_delta_e,
+            stage_cache=stages
+        )
 
-        return {
+        detection = {
             "colours": analysis["colours"],
-            "colour_count": analysis["colour_count"]
+            "colour_count": analysis["colour_count"],
+            "colour_map": analysis["colour_map"]
         }
+        registry.set_colours(job_id, key, detection)
+        return detection
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -1,48 +1,124 @@
 from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from typing import Optional
 import os
 
 from app.models.convert_req import ConvertRequest
-from app.models.convert_resp import ConvertResponse
+from app.models.convert_resp import ConvertJobResponse
 from app.services.conversion_service import ConversionService
+from app.services.job_manager import JobManager
+from app.config import CONVERT_WORKERS
 
 router = APIRouter(prefix="/convert", tags=["Convert"])
 service = ConversionService()
+jobs = JobManager(service, workers=CONVERT_WORKERS)
 
 
 class ConvertRequest_JSON(ConvertRequest):
     job_id: str
-    upload_path: str
+    # Only needed for uploads made before the job registry
+    upload_path: Optional[str] = None
 
 
-@router.post("", response_model=ConvertResponse)
+def _service_request(body: ConvertRequest_JSON) -> ConvertRequest:
+    """Build the ConvertRequest for the service from the JSON body"""
+    return ConvertRequest(**body.model_dump(exclude={"job_id", "upload_path"}))
+
+
+def _job(body: ConvertRequest_JSON) -> dict:
+    """The registry record of the body's job, or 404; may read the PDF, so
+    async handlers call it in a worker thread"""
+    job = service.registry.resolve(body.job_id, body.upload_path)
+    if job is None or not os.path.exists(job["upload_path"]):
+        raise HTTPException(status_code=404, detail="Upload not found")
+    return job
+
+
+@router.post("", response_model=ConvertJobResponse, status_code=202)
 async def convert_pdf(body: ConvertRequest_JSON):
     """
-    Convert PDF to G-code via pre-uploaded file
+    Queue a conversion of a pre-uploaded PDF; poll GET /convert/{job_id} for the result
     """
 
+    # Registering a legacy upload and cache hits touch the disk: keep them off the event loop
+    job = await run_in_threadpool(_job, body)
+
     try:
-        if not os.path.exists(body.upload_path):
-            raise HTTPException(status_code=404, detail="Upload not found")
-
-        # Build ConvertRequest for service
-        request_data = ConvertRequest(
-            printer=body.printer,
-            mode=body.mode,
-            line_segments=body.line_segments,
-            rotate=body.rotate,
-            scale=body.scale,
-            dock_positions=body.dock_positions,
-            split_compound_paths=body.split_compound_paths
+        # Conversions run under the upload's job id; the registry's hash keys the caches
+        job_id = await run_in_threadpool(
+            jobs.submit,
+            pdf_path=job["upload_path"],
+            request=_service_request(body),
+            job_id=body.job_id,
+            sha256=job["sha256"]
         )
+        return jobs.status(job_id)
 
-        result = service.convert(
-            pdf_path=body.upload_path,
-            request=request_data
-        )
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/cache/stats")
+async def cache_stats():
+    """
+    Hit/miss counters and size of the conversion result cache
+    """
+    return service.cache.stats()
+
+
+@router.get("/{job_id}", response_model=ConvertJobResponse)
+async def conversion_status(job_id: str):
+    """
+    Status of a queued conversion, with the result once it is done
+    """
 
-        return result
+    status = jobs.status(job_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return status
 
-    except HTTPException:
-        raise
+
+@router.post("/{job_id}/cancel", response_model=ConvertJobResponse)
+async def cancel_conversion(job_id: str):
+    """
+    Cancel a queued conversion; a running one is discarded when it finishes
+    """
+
+    status = jobs.cancel(job_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return status
+
+
+@router.post("/download")
+def download_gcode(body: ConvertRequest_JSON):
+    """
+    Convert a pre-uploaded PDF and stream the G-code back as it is generated
+    """
+
+    job = _job(body)
+
+    # Both would write the job's G-code file
+    status = jobs.status(body.job_id)
+    if status is not None and status["status"] in ("queued", "running"):
+        raise HTTPException(status_code=409, detail=f"Job {body.job_id} is already being converted")
+
+    try:
+        job_id, chunks = service.stream(
+            pdf_path=job["upload_path"],
+            request=_service_request(body),
+            job_id=body.job_id,
+            sha256=job["sha256"]
+        )
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+    suffix = "multicolour" if body.mode == "multi" else "output"
+    return StreamingResponse(
+        chunks,
+        media_type="text/plain",
+        headers={"Content-Disposition": f'attachment; filename="{job_id}_{suffix}.gcode"'}
+    )
@@ -13,4 +13,36 @@ RETRACT_HEIGHT = 20
 PLOT_HEIGHT = 63
 
 # Forward offset of pen so that center of pen is the coords instead of extruder
-PEN_OFFSET_FWD = 45
\ No newline at end of file
+PEN_OFFSET_FWD = 45
+
+# Worker processes converting colour layers in parallel (None = one per CPU core);
+# jobs queued through /convert use one each, CONVERT_WORKERS sets their parallelism
+COLOUR_WORKERS = None
+
+# Also write each colour layer to its own SVG file next to the drawing (debugging only)
+WRITE_LAYER_SVGS = False
+
+# Worker processes running queued /convert jobs (None = one per CPU core)
+CONVERT_WORKERS = None
+
+# Finished /convert jobs kept for status queries; the oldest are forgotten first
+JOB_HISTORY = 1000
+
+# Disk space (bytes) for cached conversion results; least recently used are evicted first
+RESULT_CACHE_BYTES = 512 * 1024 * 1024
+
+# Rendered, cleaned and colour-split pages shared by detect-colours and convert
+STAGE_CACHE_DIR = "storage/cache/stages"
+STAGE_CACHE_BYTES = 256 * 1024 * 1024
+
+# Largest accepted PDF upload (bytes); bigger ones are rejected with 413
+MAX_UPLOAD_BYTES = 100 * 1024 * 1024
+
+# Allowance for the multipart boundaries and headers around the PDF
+UPLOAD_OVERHEAD_BYTES = 64 * 1024
+
+# Bytes of request body collected before they are parsed, hashed and written to disk
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+# SQLite database of uploaded jobs and their metadata, colours and artifacts
+JOB_DB_PATH = "storage/jobs.sqlite3"
@@ -1,7 +1,29 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
 from app.api import convert, analyze
+from app.config import MAX_UPLOAD_BYTES, UPLOAD_OVERHEAD_BYTES
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    # Queued conversions are dropped; running ones are not waited for
+    convert.jobs.shutdown()
+
+
+app = FastAPI(lifespan=lifespan)
+
+
+@app.middleware("http")
+async def limit_upload_size(request: Request, call_next):
+    """Refuse oversized uploads from their Content-Length, before the body is read;
+    uploads without one are cut off while they stream in (see analyze._save_upload)"""
+    length = request.headers.get("content-length")
+    if (request.url.path == "/analyze/upload" and length and length.isdigit()
+            and int(length) > MAX_UPLOAD_BYTES + UPLOAD_OVERHEAD_BYTES):
+        return JSONResponse(status_code=413, content={"detail": f"PDF larger than {MAX_UPLOAD_BYTES} bytes"})
+    return await call_next(request)
 
 app.include_router(convert.router)
 app.include_router(analyze.router)
\ No newline at end of file
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import Literal
+from typing import Literal, Optional
 
 
 class DimensionCheckRequest(BaseModel):
@@ -12,6 +12,22 @@ class DimensionCheckRequest(BaseModel):
         description="Rotate PDF 90 degrees before checking dimensions"
     )
 
-class ColourDetectRequest(BaseModel):
+class ColourMergeOptions(BaseModel):
+    """How far colour layers are merged; detect-colours and convert must agree"""
+
+    max_colours: Optional[int] = Field(
+        default=None,
+        ge=1,
+        description="Merge the perceptually closest colours until at most this many layers remain"
+    )
+
+    colour_merge_delta_e: Optional[float] = Field(
+        default=None,
+        gt=0,
+        le=100,
+        description="Merge colours whose CIE76 ΔE (Lab) is within this distance; about 2.3 is just noticeable"
+    )
+
+class ColourDetectRequest(ColourMergeOptions):
     """Pipeline request - without job tracking"""
-    pass
\ No newline at end of file
+    pass
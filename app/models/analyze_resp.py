@@ -1,9 +1,11 @@
 from pydantic import BaseModel
-from typing import List
+from typing import List, Dict
 
 class UploadAnalyzeResponse(BaseModel):
     job_id: str
     upload_path: str
+    sha256: str
+    page_count: int
     width: float
     height: float
     layout: str
@@ -19,4 +21,19 @@ class DimensionCheckResponse(BaseModel):
 
 class ColourDetectResponse(BaseModel):
     colours: List[str]
-    colour_count: int
\ No newline at end of file
+    colour_count: int
+    colour_map: Dict[str, str]
+
+class JobResponse(BaseModel):
+    job_id: str
+    upload_path: str
+    sha256: str
+    page_count: int
+    width: float
+    height: float
+    layout: str
+    needs_rotation: bool
+    fits: Dict[str, Dict[str, DimensionCheckResponse]]
+    colours: Dict[str, ColourDetectResponse]
+    artifacts: Dict[str, str]
+    created_at: float
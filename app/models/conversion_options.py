@@ -0,0 +1,119 @@
+from pydantic import BaseModel, Field
+from typing import Optional, Literal
+
+
+class ConversionOptions(BaseModel):
+    """Every knob of the SVG → G-code stage, so conversion never has to ask on stdin"""
+
+    line_segments: int = Field(
+        default=50,
+        ge=1,
+        le=500,
+        description="Number of segments used to approximate curves"
+    )
+
+    flatten_tolerance: Optional[float] = Field(
+        default=None,
+        gt=0,
+        le=5,
+        description="Maximum chordal deviation (mm) for adaptive curve flattening, replaces line_segments when set"
+    )
+
+    simplify_tolerance: Optional[float] = Field(
+        default=None,
+        gt=0,
+        le=1,
+        description="Ramer-Douglas-Peucker tolerance (mm) applied to the flattened paths; also drops points closer than the 0.001mm output resolution"
+    )
+
+    overlap_tolerance: Optional[float] = Field(
+        default=None,
+        gt=0,
+        le=1,
+        description="Skip strokes, or stretches of strokes, that lie within this distance (mm) of lines already drawn"
+    )
+
+    # Drawing order options
+    path_order: Literal["nearest", "serpentine"] = Field(
+        default="serpentine",
+        description="Path ordering: centroid serpentine, or nearest-neighbour on path endpoints (shorter travel, slower to plan)"
+    )
+
+    path_order_time: float = Field(
+        default=1.0,
+        ge=0,
+        le=30,
+        description="Seconds spent improving the nearest-neighbour order with 2-opt (0 disables); a time limit, so output may vary between runs"
+    )
+
+    chain_tolerance: float = Field(
+        default=0.0,
+        ge=0,
+        le=1,
+        description="Join paths whose endpoints are within this distance (mm) into one stroke (0, the default, disables)"
+    )
+
+    # Output options
+    arc_fitting: bool = Field(
+        default=False,
+        description="Replace runs of G1 moves that follow a circle with G2/G3 arcs"
+    )
+
+    arc_tolerance: float = Field(
+        default=0.01,
+        gt=0,
+        le=1,
+        description="Maximum deviation (mm) between a fitted arc and the polyline it replaces"
+    )
+
+    compact_gcode: bool = Field(
+        default=False,
+        description="Drop repeated modal words (F, unchanged axes) and merge collinear moves in the output"
+    )
+
+    travel_feedrate: int = Field(
+        default=3000,
+        gt=0,
+        description="Feedrate (mm/min) of pen-up moves to the start of a stroke"
+    )
+
+    draw_feedrate: int = Field(
+        default=2000,
+        gt=0,
+        description="Feedrate (mm/min) of pen-down drawing moves"
+    )
+
+    # Path clean-up options
+    split_compound_paths: bool = Field(
+        default=False,
+        description="Split compound paths before conversion"
+    )
+
+    gap_threshold: float = Field(
+        default=1.0,
+        gt=0,
+        description="Gap (SVG units) between subpaths that marks a compound path"
+    )
+
+    tiny_path_size: float = Field(
+        default=1.0,
+        ge=0,
+        description="Paths whose bounding box is smaller than this (SVG units) are dropped"
+    )
+
+    remove_bounding_box: bool = Field(
+        default=True,
+        description="Drop four-segment paths that span the whole drawing (page frames)"
+    )
+
+    serpentine_band: float = Field(
+        default=5.0,
+        gt=0,
+        description="Height (mm) of the rows used by the serpentine path order"
+    )
+
+    # Multi-colour options
+    plan_tool_changes: bool = Field(
+        default=True,
+        description="Order dock groups and the colour layers inside them by estimated machine time instead of as given"
+    )
@@ -1,19 +1,15 @@
-from pydantic import BaseModel, Field
+from pydantic import Field
 from typing import Optional, Dict, Literal
 
+from app.models.conversion_options import ConversionOptions
+from app.models.analyze_req import ColourMergeOptions
 
-class ConvertRequest(BaseModel):
+
+class ConvertRequest(ConversionOptions, ColourMergeOptions):
 
     printer: Literal["A1 Mini", "P1S/P2S", "A1", "H2D"]
     mode: Literal["single", "multi"]
     
-    line_segments: int = Field(
-        default=50,
-        ge=1,
-        le=500,
-        description="Number of segments used to approximate curves"
-    )
-
     # Transformation options
     rotate: bool = Field(
         default=False,
@@ -29,10 +25,5 @@ class ConvertRequest(BaseModel):
     # Only used in multi-colour mode
     dock_positions: Optional[Dict[str, int]] = Field(
         default=None,
-        description="Mapping of colour_hex → dock number (1-6)"
+        description="Mapping of colour_hex → dock number (1-6), using the merged colours from detect-colours"
     )
-    
-    split_compound_paths: bool = Field(
-        default=False,
-        description="Split compound paths before conversion"
-    )
\ No newline at end of file
@@ -1,7 +1,17 @@
 from pydantic import BaseModel
-from typing import Optional, List
+from typing import Optional, List, Dict, Literal
 
 class ConvertResponse(BaseModel):
     gcode: str
     svg: Optional[str] = None
-    colours: Optional[List[str]] = None
\ No newline at end of file
+    colours: Optional[List[str]] = None
+    colour_map: Optional[Dict[str, str]] = None
+    stats: Optional[Dict[str, float]] = None
+    errors: Optional[Dict[str, str]] = None
+    cached: bool = False
+
+class ConvertJobResponse(BaseModel):
+    job_id: str
+    status: Literal["queued", "running", "done", "failed", "cancelled"]
+    result: Optional[ConvertResponse] = None
+    error: Optional[str] = None
@@ -38,6 +38,77 @@ class PDFAnalyzer:
         except Exception as e:
             raise Exception(f"Failed to get dimensions: {str(e)}")
 
+    @staticmethod
+    def get_metadata(pdf_path: str):
+        """
+        Everything the analyze endpoints need, from one open of the PDF
+
+        Returns:
+            dict: page_count, width, height, layout, needs_rotation (first page, mm)
+                  and fits: {printer: {"upright": fit, "rotated": fit}} for every
+                  printer in PRINTERS, each fit as returned by check_dimensions
+        """
+        try:
+            doc = pymupdf.open(pdf_path)
+            page_count = doc.page_count
+            page = doc.load_page(0)
+            width = page.rect.width * POINTS_TO_MM
+            height = page.rect.height * POINTS_TO_MM
+            doc.close()
+        except Exception as e:
+            raise Exception(f"Failed to read PDF: {str(e)}")
+
+        layout = "portrait" if height >= width else "landscape"
+
+        # A 90 degree rotation swaps the page's width and height
+        fits = {
+            printer: {
+                "upright": PDFAnalyzer.fit(width, height, printer),
+                "rotated": PDFAnalyzer.fit(height, width, printer)
+            }
+            for printer in PRINTERS
+        }
+
+        return {
+            "page_count": page_count,
+            "width": width,
+            "height": height,
+            "layout": layout,
+            "needs_rotation": layout == "portrait",
+            "fits": fits
+        }
+
+    @staticmethod
+    def fit(width: float, height: float, printer: str):
+        """
+        Fit of a page of width x height mm on the printer's drawable area
+
+        Returns:
+            dict: fits, width, height, max_x, max_y, required_scale
+        """
+        printer_config = PRINTERS[printer]
+        max_x = printer_config["max_x"]
+        max_y = printer_config["max_y"] - PEN_OFFSET_FWD
+
+        fits = width <= max_x and height <= max_y
+
+        if fits:
+            scale = 1.0
+        else:
+            # Calculate scale needed
+            scale_x = max_x / width
+            scale_y = max_y / height
+            scale = min(scale_x, scale_y)
+
+        return {
+            "fits": fits,
+            "width": width,
+            "height": height,
+            "max_x": max_x,
+            "max_y": max_y,
+            "required_scale": scale if not fits else 1.0
+        }
+
     @staticmethod
     def check_dimensions(pdf_path: str, printer: str, rotate: bool = False):
         """
@@ -68,34 +139,14 @@ class PDFAnalyzer:
             height = page.rect.height * POINTS_TO_MM
             doc.close()
 
-            printer_config = PRINTERS[printer]
-            max_x = printer_config["max_x"]
-            max_y = printer_config["max_y"] - PEN_OFFSET_FWD
-
-            fits = width <= max_x and height <= max_y
-
-            if fits:
-                scale = 1.0
-            else:
-                # Calculate scale needed
-                scale_x = max_x / width
-                scale_y = max_y / height
-                scale = min(scale_x, scale_y)
-
-            return {
-                "fits": fits,
-                "width": width,
-                "height": height,
-                "max_x": max_x,
-                "max_y": max_y,
-                "required_scale": scale if not fits else 1.0
-            }
+            return PDFAnalyzer.fit(width, height, printer)
 
         except Exception as e:
             raise Exception(f"Failed to check dimensions: {str(e)}")
 
     @staticmethod
-    def detect_colours(pdf_path: str, output_svg_path: str = None):
+    def detect_colours(pdf_path: str, output_svg_path: str = None, max_colours: int = None,
+                       merge_delta_e: float = None, stage_cache=None):
         """
         Detect colours in PDF by converting to SVG and splitting by colour
         
@@ -103,9 +154,13 @@ class PDFAnalyzer:
             pdf_path: Path to PDF file
             output_svg_path: Optional path to save colour SVG. 
                            If None, uses temp location
+            max_colours: Optional cap on the number of colour layers
+            merge_delta_e: Optional ΔE below which colours are merged
+            stage_cache: Optional StageCache shared with conversion
         
         Returns:
-            dict: colours (list of hex colours), colour_count
+            dict: colours (list of hex colours), colour_count,
+                  colour_map (original colour → merged colour)
         """
         if not os.path.exists(pdf_path):
             raise ValueError(f"PDF not found: {pdf_path}")
@@ -118,13 +173,20 @@ class PDFAnalyzer:
                 output_svg_path = pdf_path.replace(".pdf", "_colours.svg")
 
             pdf_to_svg = PdfToSvg(pdf_path, output_svg_path, max_x, max_y)
-            width, height, temp_svg, colour_svgs = pdf_to_svg.run(split_colours=True)
+            width, height, temp_svg, colour_layers = pdf_to_svg.run(
+                split_colours=True,
+                write_svg=False,
+                max_colours=max_colours,
+                merge_delta_e=merge_delta_e,
+                stage_cache=stage_cache
+            )
 
-            colours = list(colour_svgs.keys())
+            colours = list(colour_layers.keys())
 
             return {
                 "colours": colours,
-                "colour_count": len(colours)
+                "colour_count": len(colours),
+                "colour_map": pdf_to_svg.colour_map
             }
 
         except Exception as e:
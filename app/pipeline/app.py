@@ -2,7 +2,8 @@
 
 from app.pipeline.pdf_to_svg import PdfToSvg
 from app.pipeline.svg_to_gcode import SvgToGCode
-from app.pipeline.multi_colour_manager import MulticolourManager
+from app.pipeline.multi_colour_manager import MultiColourManager
+from app.models.conversion_options import ConversionOptions
 from app.config import PRINTERS, PEN_OFFSET_FWD, RETRACT_HEIGHT, PLOT_HEIGHT
 
 print("\nWelcome to Ink in 3D Printer")
@@ -58,6 +59,12 @@ while True:
     except ValueError:
         print("Invalid input. Please enter a valid number.")
 
+split_answer = input("\nSplit compound paths (multiple subpaths) into separate paths? (y/n, default n): ").strip().lower()
+split_compound_paths = split_answer == "y"
+
+# Everything the converter needs is decided here; it never prompts itself
+options = ConversionOptions(line_segments=line_segments, split_compound_paths=split_compound_paths)
+
 max_x = printer_config['max_x']
 max_y = printer_config['max_y'] - PEN_OFFSET_FWD
 
@@ -73,12 +80,12 @@ if mode_choice == 1:
         svg_file="drawing.svg",
         output_file="output.gcode",
         scale_factor=pdf_to_svg.scale_factor,
-        line_segments=line_segments,
         retraction_height=RETRACT_HEIGHT,
         plot_height=PLOT_HEIGHT,
         max_x=max_x,
         max_y=max_y,
-        pen_offset_y=PEN_OFFSET_FWD
+        pen_offset_y=PEN_OFFSET_FWD,
+        options=options
     )
     
     svg_to_gcode.run()
@@ -86,18 +93,20 @@ if mode_choice == 1:
 
 else:
     # Multi Colour Mode
-    width, height, temp_svg, colour_svgs = pdf_to_svg.run(split_colours=True)
+    width, height, temp_svg, colour_layers = pdf_to_svg.run(split_colours=True)
     
-    manager = MulticolourManager(
-        colour_svgs=colour_svgs,
+    manager = MultiColourManager(
+        colour_layers=colour_layers,
         output_file="final_multicolour.gcode",
         scale_factor=pdf_to_svg.scale_factor,
-        line_segments=line_segments,
         retraction_height=RETRACT_HEIGHT,
         plot_height=PLOT_HEIGHT,
         max_x=max_x,
         max_y=max_y,
-        pen_offset_y=PEN_OFFSET_FWD
+        pen_offset_y=PEN_OFFSET_FWD,
+        options=options,
+        # This script prompts at import time, so it must not be re-imported by pool workers
+        workers=1
     )
     
     manager.assemble()
@@ -0,0 +1,106 @@
+# arc_fitting.py
+import numpy as np
+
+# Fewest polyline points worth replacing with one arc (three G1 chords)
+MIN_ARC_POINTS = 4
+
+# Larger radii are effectively straight; G1 is the safer move there
+MAX_ARC_RADIUS = 1000.0
+
+
+class ArcFitter:
+    """
+    Replaces runs of polyline points with circular arcs (G2/G3) where every
+    point lies within `tolerance` of the circle and every chord stays within
+    `tolerance` of the arc. Each arc is grown greedily: doubling its length
+    while it still fits, then binary searching for the last point that fits.
+    """
+
+    def __init__(self, tolerance, max_radius=MAX_ARC_RADIUS):
+        self.tolerance = tolerance
+        self.max_radius = max_radius
+
+    @staticmethod
+    def _circle(a, b, c):
+        """Centre of the circle through three points, or None when collinear"""
+        b, c = b - a, c - a
+        d = 2.0 * (b.real * c.imag - b.imag * c.real)
+        if abs(d) < 1e-12:
+            return None
+        bb, cc = abs(b) ** 2, abs(c) ** 2
+        ux = (c.imag * bb - b.imag * cc) / d
+        uy = (b.real * cc - c.real * bb) / d
+        return a + complex(ux, uy)
+
+    def _fit(self, points, i, j):
+        """(centre, ccw) of an arc through points[i..j], or None if it does not fit"""
+        run = points[i:j + 1]
+        centre = self._circle(run[0], run[len(run) // 2], run[-1])
+        if centre is None:
+            return None
+
+        radius = abs(run[0] - centre)
+        if radius > self.max_radius:
+            return None
+
+        # Points on the circle
+        if np.abs(np.abs(run - centre) - radius).max() > self.tolerance:
+            return None
+
+        # Chords close to the arc (sagitta)
+        half = np.abs(np.diff(run)) / 2.0
+        if half.max() >= radius:
+            return None
+        if (radius - np.sqrt(radius ** 2 - half ** 2)).max() > self.tolerance:
+            return None
+
+        # Monotonic sweep in one direction, short of a full turn
+        steps = np.diff(np.unwrap(np.angle(run - centre)))
+        if not ((steps > 0).all() or (steps < 0).all()):
+            return None
+        if abs(steps.sum()) >= 2 * np.pi - 1e-3:
+            return None
+
+        return centre, bool(steps[0] > 0)
+
+    def fit(self, points):
+        """Moves drawing the polyline after its first point.
+
+        Each move is (end_index, None) for a straight G1, or
+        (end_index, (centre, ccw)) for an arc."""
+        n = len(points)
+        moves = []
+        i = 0
+
+        while i < n - 1:
+            first = i + MIN_ARC_POINTS - 1
+            arc = self._fit(points, i, first) if first < n else None
+            if arc is None:
+                moves.append((i + 1, None))
+                i += 1
+                continue
+
+            # Double the run while it still fits ...
+            good, step = first, 1
+            bad = n
+            while good + step < n:
+                candidate = self._fit(points, i, good + step)
+                if candidate is None:
+                    bad = good + step
+                    break
+                good, arc = good + step, candidate
+                step *= 2
+
+            # ... then binary search the last point that fits
+            while bad - good > 1 and good < n - 1:
+                mid = (good + bad) // 2
+                candidate = self._fit(points, i, mid)
+                if candidate is None:
+                    bad = mid
+                else:
+                    good, arc = mid, candidate
+
+            moves.append((good, arc))
+            i = good
+
+        return moves
@@ -0,0 +1,77 @@
+# colour_clustering.py
+import numpy as np
+
+# D65 reference white
+WHITE_XYZ = np.array([0.95047, 1.0, 1.08883])
+
+SRGB_TO_XYZ = np.array([[0.4124564, 0.3575761, 0.1804375],
+                        [0.2126729, 0.7151522, 0.0721750],
+                        [0.0193339, 0.1191920, 0.9503041]])
+
+
+def hex_to_lab(colours):
+    """(n, 3) CIE L*a*b* values for 6-digit hex colours (sRGB, D65)"""
+    rgb = np.array([[int(c[i:i + 2], 16) for i in (0, 2, 4)] for c in colours], dtype=float).reshape(-1, 3) / 255.0
+
+    # sRGB companding → linear light
+    linear = np.where(rgb <= 0.04045, rgb / 12.92, ((rgb + 0.055) / 1.055) ** 2.4)
+    xyz = linear @ SRGB_TO_XYZ.T / WHITE_XYZ
+
+    f = np.where(xyz > (6 / 29) ** 3, np.cbrt(xyz), xyz / (3 * (6 / 29) ** 2) + 4 / 29)
+    return np.stack((116 * f[:, 1] - 16,
+                     500 * (f[:, 0] - f[:, 1]),
+                     200 * (f[:, 1] - f[:, 2])), axis=1)
+
+
+def delta_e(lab_a, lab_b):
+    """CIE76 colour difference, broadcasting over leading dimensions"""
+    return np.linalg.norm(lab_a - lab_b, axis=-1)
+
+
+def cluster_colours(weights, max_colours=None, max_delta_e=None):
+    """Merge perceptually close colours.
+
+    weights maps hex colour → how much of the drawing uses it (e.g. shape
+    count). Clusters are merged closest-first by ΔE between their weighted
+    Lab centroids, while more than max_colours remain or while the closest
+    pair is within max_delta_e. Each cluster is named after its heaviest
+    member, so layers keep a colour that really occurs in the document.
+
+    Returns {colour: representative colour} for every input colour."""
+    colours = list(weights)
+    if len(colours) < 2 or (not max_colours and not max_delta_e):
+        return {c: c for c in colours}
+
+    lab = hex_to_lab(colours)
+    weight = np.array([max(weights[c], 1e-9) for c in colours], dtype=float)
+    members = [[i] for i in range(len(colours))]
+
+    while len(members) > 1:
+        dist = delta_e(lab[:, None, :], lab[None, :, :])
+        np.fill_diagonal(dist, np.inf)
+        i, j = np.unravel_index(np.argmin(dist), dist.shape)
+        i, j = min(i, j), max(i, j)
+
+        over_limit = max_colours is not None and len(members) > max_colours
+        close = max_delta_e is not None and dist[i, j] <= max_delta_e
+        if not (over_limit or close):
+            break
+
+        # Fold cluster j into i at their weighted centre
+        total = weight[i] + weight[j]
+        lab[i] = (lab[i] * weight[i] + lab[j] * weight[j]) / total
+        weight[i] = total
+        members[i].extend(members[j])
+
+        lab = np.delete(lab, j, axis=0)
+        weight = np.delete(weight, j)
+        del members[j]
+
+    mapping = {}
+    for group in members:
+        # First heaviest member in document order names the cluster
+        group = sorted(group)
+        representative = colours[max(group, key=lambda k: weights[colours[k]])]
+        for k in group:
+            mapping[colours[k]] = representative
+    return mapping
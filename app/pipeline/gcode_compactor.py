@@ -0,0 +1,248 @@
+# gcode_compactor.py
+import re
+from decimal import Decimal, InvalidOperation
+
+WORD_RE = re.compile(r"([A-Za-z])\s*([-+]?(?:\d+\.?\d*|\.\d+))")
+
+# Modal words tracked on linear moves
+AXES = ("X", "Y", "Z", "E")
+
+
+class GCodeCompactor:
+    """
+    Post-processing pass over G-code lines that keeps the motion identical
+    while making the file smaller:
+    - drops X/Y/Z/E words that repeat the current position
+    - drops F words that repeat the current feedrate
+    - drops moves left with nothing to do
+    - merges consecutive exactly collinear XY moves at the same feedrate
+
+    Positions are only tracked in absolute mode (G90); relative moves and
+    anything after an unknown G command are passed through until the state is
+    known again. Values are compared as decimals, so "exactly" means exactly
+    as written in the file.
+    """
+
+    def __init__(self):
+        self.position = {}
+        self.feed = None
+        self.relative = False
+        self.relative_e = False
+        self.pending = None
+
+        self.stats = {
+            "gcode_bytes_before": 0,
+            "gcode_bytes_after": 0,
+            "gcode_moves_merged": 0,
+        }
+
+    # -------------------------------------------------------------
+    # Line parsing
+    # -------------------------------------------------------------
+    @staticmethod
+    def _parse(line):
+        """Split a line into (command, [(letter, text, value)], comment), or None if unsupported"""
+        code, sep, comment = line.partition(";")
+        tokens = code.split()
+        if not tokens:
+            return "", [], sep + comment
+
+        words = []
+        for token in tokens[1:]:
+            m = WORD_RE.fullmatch(token)
+            if m is None:
+                return None
+            try:
+                words.append((m.group(1).upper(), m.group(2), Decimal(m.group(2))))
+            except InvalidOperation:
+                return None
+
+        return tokens[0].upper(), words, sep + comment
+
+    @staticmethod
+    def _format(command, words, comment):
+        code = " ".join([command] + [letter + text for letter, text, _ in words])
+        return f"{code} {comment}" if comment else code
+
+    # -------------------------------------------------------------
+    # Collinear merging of pen-down XY moves
+    # -------------------------------------------------------------
+    def _flush(self):
+        if self.pending is None:
+            return None
+        start, end, feed_word = self.pending
+        self.pending = None
+
+        words = []
+        if end[0][1] != start[0]:
+            words.append(("X",) + end[0])
+        if end[1][1] != start[1]:
+            words.append(("Y",) + end[1])
+        if feed_word is not None:
+            words.append(feed_word)
+        return self._format("G1", words, "")
+
+    def _extends_pending(self, x, y):
+        """True when moving on to (x, y) continues the pending move in the same direction"""
+        start, end, _ = self.pending
+        x0, y0 = start
+        x1, y1 = end[0][1], end[1][1]
+        dx1, dy1 = x1 - x0, y1 - y0
+        dx2, dy2 = x - x1, y - y1
+        return dx1 * dy2 - dy1 * dx2 == 0 and dx1 * dx2 + dy1 * dy2 > 0
+
+    # -------------------------------------------------------------
+    # Main pass
+    # -------------------------------------------------------------
+    def _compact_line(self, line):
+        """Yield the output lines for one input line"""
+        parsed = self._parse(line)
+
+        if parsed is None or self.relative:
+            # Unknown syntax, or relative moves we do not track: pass through
+            yield from self._drain()
+            if parsed is not None and parsed[0] == "G90":
+                self.relative = False
+            if parsed is None:
+                self.position = {}
+                self.feed = None
+            yield line
+            return
+
+        command, words, comment = parsed
+
+        if command not in ("G0", "G1"):
+            yield from self._drain()
+            self._update_state(command, words)
+            if line.strip():
+                yield line.rstrip()
+            return
+
+        kept = []
+        target = dict(self.position)
+        for letter, text, value in words:
+            if letter in AXES:
+                relative_e = letter == "E" and self.relative_e
+                if not relative_e and self.position.get(letter) == value:
+                    continue
+                if not relative_e:
+                    target[letter] = value
+            elif letter == "F":
+                if self.feed == value:
+                    continue
+                self.feed = value
+            else:
+                # Words we do not model: keep the whole line as written
+                yield from self._drain()
+                self.position = {}
+                yield line.rstrip()
+                return
+            kept.append((letter, text, value))
+
+        letters = {letter for letter, _, _ in kept}
+        xy_only = (command == "G1" and not comment and "X" in self.position and "Y" in self.position
+                   and letters <= {"X", "Y", "F"})
+
+        if xy_only and letters <= {"X", "Y"} and self.pending is not None and letters:
+            x, y = target["X"], target["Y"]
+            if self._extends_pending(x, y):
+                text = {letter: t for letter, t, _ in kept}
+                _, end, _ = self.pending
+                new_x = (text["X"], x) if "X" in text else end[0]
+                new_y = (text["Y"], y) if "Y" in text else end[1]
+                self.pending = (self.pending[0], (new_x, new_y), self.pending[2])
+                self.position = target
+                self.stats["gcode_moves_merged"] += 1
+                return
+
+        if not kept and not comment:
+            return
+
+        flushed = self._flush()
+        if flushed is not None:
+            yield flushed
+
+        if not kept:
+            # Nothing left to do: keep only a comment, if there was one
+            if comment:
+                yield comment
+            return
+
+        if xy_only and letters - {"F"}:
+            start = (self.position["X"], self.position["Y"])
+            text = {letter: t for letter, t, _ in kept}
+            end = ((text.get("X", self._text(start[0])), target["X"]),
+                   (text.get("Y", self._text(start[1])), target["Y"]))
+            feed_word = next((w for w in kept if w[0] == "F"), None)
+            self.pending = (start, end, feed_word)
+            self.position = target
+            return
+
+        self.position = target
+        yield self._format(command, kept, comment)
+
+    @staticmethod
+    def _text(value):
+        return format(value, "f")
+
+    def _drain(self):
+        flushed = self._flush()
+        if flushed is not None:
+            yield flushed
+
+    def _update_state(self, command, words):
+        if command == "G90":
+            self.relative = False
+        elif command == "G91":
+            self.relative = True
+            self.position = {}
+        elif command == "M82":
+            self.relative_e = False
+        elif command == "M83":
+            self.relative_e = True
+            self.position.pop("E", None)
+        elif command == "G92":
+            axes = [(letter, value) for letter, _, value in words if letter in AXES]
+            if not axes:
+                axes = [(letter, Decimal(0)) for letter in AXES]
+            for letter, value in axes:
+                self.position[letter] = value
+        elif command in ("G2", "G3"):
+            # Arcs are kept as written; only their end point and feedrate matter here
+            for letter, _, value in words:
+                if letter in AXES and not (letter == "E" and self.relative_e):
+                    self.position[letter] = value
+                elif letter == "F":
+                    self.feed = value
+        elif command.startswith("G"):
+            # Homing and anything else that may move the head: forget the position
+            self.position = {}
+
+    def compact(self, lines):
+        """Yield the compacted lines, counting bytes in and out"""
+        for line in lines:
+            self.stats["gcode_bytes_before"] += len(line.encode()) + 1
+            for out in self._compact_line(line):
+                self.stats["gcode_bytes_after"] += len(out.encode()) + 1
+                yield out
+
+        for out in self._drain():
+            self.stats["gcode_bytes_after"] += len(out.encode()) + 1
+            yield out
+
+    def report(self):
+        before = self.stats["gcode_bytes_before"]
+        after = self.stats["gcode_bytes_after"]
+        saved = 100.0 * (before - after) / before if before else 0.0
+        print(f"Compacted G-code: {before} → {after} bytes ({saved:.1f}% smaller), "
+              f"{self.stats['gcode_moves_merged']} collinear moves merged")
+
+
+def compact(lines, stats):
+    """Compact a stream of G-code lines, adding the byte counts to `stats` once it is consumed"""
+    compactor = GCodeCompactor()
+    yield from compactor.compact(lines)
+
+    for key, value in compactor.stats.items():
+        stats[key] = stats.get(key, 0) + value
+    compactor.report()
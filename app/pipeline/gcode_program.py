@@ -0,0 +1,58 @@
+# gcode_program.py
+from itertools import chain
+
+
+def initial_sequence(plot_height, retraction_height):
+    """Machine setup at the start of every file"""
+    return [
+        "; ------------Initial Sequence------------",
+        "G92 E0          ;Reset extruder",
+        "M82             ;Absolute extrusion coordinates",
+        "G90             ;Absolute position coordinates",
+        f"G1 Z{plot_height + retraction_height} ; pen up",
+        "; ------------Initial Sequence------------",
+    ]
+
+
+def prime_sequence(plot_height, retraction_height, pen_offset_y):
+    """Small wiggle at the origin that gets ink flowing before a pen draws"""
+    return [
+        f"G1 X0 Y{pen_offset_y} Z{plot_height} ",
+        f"G1 X0.01 Y{pen_offset_y + 0.01} Z{plot_height} E0.001 F1200",
+        f"G1 X0 Y{pen_offset_y} Z{plot_height} F3000",
+        f"G1 Z{plot_height + retraction_height} ; pen up",
+    ]
+
+
+def end_sequence():
+    return [
+        "; ------------End Sequence------------",
+        "M84            ;Disable Motors",
+        "; ------------End Sequence------------",
+    ]
+
+
+class GCodeProgram:
+    """
+    A G-code program kept as structure rather than text:
+    - header: lines before any drawing
+    - blocks: one list of lines per drawn unit (a stroke, a pen swap, ...),
+      either a list or a generator that produces them on demand
+    - footer: lines after the last block
+    - stats: counters from whoever produced the blocks
+
+    Programs are spliced by combining their blocks; text only exists once
+    lines() is written out.
+    """
+
+    def __init__(self, header, blocks, footer, stats=None):
+        self.header = header
+        self.blocks = blocks
+        self.footer = footer
+        self.stats = stats if stats is not None else {}
+
+    def body_lines(self):
+        return chain.from_iterable(self.blocks)
+
+    def lines(self):
+        return chain(self.header, self.body_lines(), self.footer)
@@ -0,0 +1,59 @@
+# gcode_timing.py
+import math
+import re
+
+# Feedrate (mm/min) assumed until the program sets one
+DEFAULT_FEEDRATE = 3000.0
+
+# Machine state before the first line: x, y, z, feedrate
+START_STATE = (0.0, 0.0, 0.0, DEFAULT_FEEDRATE)
+
+WORD = re.compile(r"([A-Z])\s*(-?\d*\.?\d+)")
+
+
+def _words(line):
+    code = line.split(";", 1)[0].upper()
+    return {letter: float(value) for letter, value in WORD.findall(code)}
+
+
+def _arc_length(x0, y0, x1, y1, i, j, ccw):
+    cx, cy = x0 + i, y0 + j
+    radius = math.hypot(i, j)
+    start = math.atan2(y0 - cy, x0 - cx)
+    end = math.atan2(y1 - cy, x1 - cx)
+    sweep = (end - start) if ccw else (start - end)
+    sweep %= 2 * math.pi
+    if sweep == 0.0:
+        sweep = 2 * math.pi
+    return radius * sweep
+
+
+def estimate_time(lines, state=START_STATE):
+    """Seconds taken by absolute G0-G3 moves, and the machine state after them.
+
+    Every move runs at its programmed feedrate from start to end; acceleration
+    is not modelled, so this is a lower bound that is good for comparing
+    alternative orderings of the same moves."""
+    x, y, z, f = state
+    seconds = 0.0
+
+    for line in lines:
+        words = _words(line)
+        g = words.get("G")
+        if g not in (0, 1, 2, 3):
+            continue
+
+        f = words.get("F", f)
+        nx, ny, nz = words.get("X", x), words.get("Y", y), words.get("Z", z)
+
+        if g in (2, 3) and ("I" in words or "J" in words):
+            planar = _arc_length(x, y, nx, ny, words.get("I", 0.0), words.get("J", 0.0), g == 3)
+            distance = math.hypot(planar, nz - z)
+        else:
+            distance = math.sqrt((nx - x) ** 2 + (ny - y) ** 2 + (nz - z) ** 2)
+
+        if f > 0:
+            seconds += distance / f * 60.0
+        x, y, z = nx, ny, nz
+
+    return seconds, (x, y, z, f)
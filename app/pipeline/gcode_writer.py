@@ -0,0 +1,41 @@
+# gcode_writer.py
+
+# Bytes of G-code buffered before a chunk is handed to the file or socket
+CHUNK_SIZE = 64 * 1024
+
+
+def iter_chunks(lines, chunk_size=CHUNK_SIZE, continued=False):
+    """Join G-code lines with newlines into strings of roughly chunk_size.
+
+    With continued=True the first line is also preceded by a newline, so
+    chunks from several calls concatenate into one newline-joined file."""
+    buf = []
+    size = 0
+    first = not continued
+
+    for line in lines:
+        piece = line if first else "\n" + line
+        first = False
+        buf.append(piece)
+        size += len(piece)
+
+        if size >= chunk_size:
+            yield "".join(buf)
+            buf = []
+            size = 0
+
+    if buf:
+        yield "".join(buf)
+
+
+def write_lines(lines, stream, chunk_size=CHUNK_SIZE):
+    """Write G-code lines to an open text stream in bounded chunks"""
+    for chunk in iter_chunks(lines, chunk_size):
+        stream.write(chunk)
+
+
+def iter_file(path, chunk_size=CHUNK_SIZE):
+    """Chunks of an already written G-code file"""
+    with open(path) as f:
+        for chunk in iter(lambda: f.read(chunk_size), ""):
+            yield chunk
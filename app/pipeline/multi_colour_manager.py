@@ -1,41 +1,117 @@
 # multi_colour_manager.py
 import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
 from .svg_to_gcode import SvgToGCode
+from .gcode_writer import write_lines
+from .gcode_program import GCodeProgram, initial_sequence, prime_sequence, end_sequence
+from .gcode_compactor import compact
+from .gcode_timing import estimate_time, START_STATE
+from .tool_change_planner import ToolChangePlanner
+from app.models.conversion_options import ConversionOptions
+
+# Lines per block when a spooled layer is read back
+SPOOL_BLOCK_LINES = 1000
+
+
+class SpooledLayer:
+    """
+    A converted colour layer whose G-code waits on disk until its turn, so a
+    job never holds more than one layer's text in memory:
+    - path: file with the layer's lines
+    - strokes: number of strokes drawn
+    - seconds, end: estimated time of the strokes and the machine state
+      after them, timed from where the prime leaves the head
+    - stats: the converter's counters
+    """
+
+    def __init__(self, path, strokes, seconds, end, stats):
+        self.path = path
+        self.strokes = strokes
+        self.seconds = seconds
+        self.end = end
+        self.stats = stats
+
+    def blocks(self):
+        """The layer's lines, read back a block at a time"""
+        block = []
+        with open(self.path) as f:
+            for line in f:
+                block.append(line.rstrip("\n"))
+                if len(block) >= SPOOL_BLOCK_LINES:
+                    yield block
+                    block = []
+        if block:
+            yield block
+
+
+def convert_colour(args, spool_dir=None, start=START_STATE):
+    """Convert one colour layer: (SpooledLayer, None) or (None, error message).
+
+    Module level so it can run in a worker process. The G-code is written to
+    a file in spool_dir as it is generated and timed from start on the way,
+    so only the file name and the timing travel back."""
+    if args is None:
+        return None, "no SVG layer for this colour"
+
+    fd, path = tempfile.mkstemp(suffix=".gcode", dir=spool_dir)
+    try:
+        program = SvgToGCode(output_file=None, **args).program()
+        strokes, seconds, state = 0, 0.0, start
+        with os.fdopen(fd, "w") as f:
+            for block in program.blocks:
+                block_seconds, state = estimate_time(block, state)
+                strokes += 1
+                seconds += block_seconds
+                f.write("\n".join(block) + "\n")
+        return SpooledLayer(path, strokes, seconds, state, program.stats), None
+    except Exception as e:
+        os.remove(path)
+        return None, f"{type(e).__name__}: {e}"
+
 
 class MultiColourManager:
     """
     Handles multi‑colour printing:
-    - receives a dict of {colour_hex: svg_path}
+    - receives a dict of {colour_hex: layer}, each an in-memory shape list
+      from PdfToSvg.split_by_colour or the path of an SVG file
     - asks user for dock position for each colour (0 = skip)
-    - runs each SVG through SvgToGCode
+    - runs each SVG through SvgToGCode, in a process pool when workers > 1
     - merges colours by dock position
+    - orders dock groups and layers by estimated time (ToolChangePlanner)
     - wraps each dock group with pickup/dropoff comments
     - header/footer appear only once
     """
 
-    def __init__(self, colour_svgs, output_file, scale_factor, line_segments,
-                 retraction_height, plot_height, max_x, max_y, pen_offset_y, dock_positions=None):
+    def __init__(self, colour_layers, output_file, scale_factor,
+                 retraction_height, plot_height, max_x, max_y, pen_offset_y, dock_positions=None,
+                 options=None, workers=None):
 
         # If no colours detected but paths exist, default to black
-        if not colour_svgs:
+        if not colour_layers:
             raise ValueError("PdfToSvg returned no colour layers. Cannot continue.")
 
-        self.colour_svgs = colour_svgs
+        self.colour_layers = colour_layers
         self.output_file = output_file
         self.scale_factor = scale_factor
-        self.line_segments = line_segments
         self.retraction_height = retraction_height
         self.plot_height = plot_height
         self.max_x = max_x
         self.max_y = max_y
         self.pen_offset_y = pen_offset_y
+        self.options = options if options is not None else ConversionOptions()
+        self.workers = workers if workers is not None else (os.cpu_count() or 1)
+        self.stats = {}
+        self.errors = {}
+        # Colours in errors only because their layer had nothing to draw
+        self.empty = set()
 
         # Use provided dock_positions, or default all to dock 1 if not provided
         if dock_positions:
             self.dock_positions = dock_positions
         else:
             # Default: assign all colours to dock 1
-            self.dock_positions = {colour: 1 for colour in colour_svgs.keys()}
+            self.dock_positions = {colour: 1 for colour in colour_layers.keys()}
 
     # -------------------------------------------------------------
     # Pen pickup/dropoff sequences (X value is parameterized)
@@ -68,113 +144,161 @@ class MultiColourManager:
         """Calculate X position for docker based on docker number (1-6)"""
         return 16 + (docker_num - 1) * 45
 
-    # Extract header/footer from one G-code file
-    # -------------------------------------------------------------
-    def _extract_header_footer(self, lines):
-        header = []
-        footer = []
-        body = []
-
-        in_header = True
-        in_footer = False
-
-        for line in lines:
-            if "Initial Sequence" in line:
-                header.append(line)
-                continue
-            if "End Sequence" in line:
-                in_footer = True
-                footer.append(line)
-                continue
-
-            if in_header:
-                header.append(line)
-                if "; pen up" in line:
-                    in_header = False
-                continue
-
-            if in_footer:
-                footer.append(line)
-                continue
-
-            body.append(line)
-
-        return header, body, footer
-
     # -------------------------------------------------------------
-    # Convert each colour SVG → cleaned G‑code block
+    # Convert colour SVGs → G‑code blocks, in parallel when allowed
     # -------------------------------------------------------------
-    def _convert_each_colour(self):
-        blocks = {}
-        header = None
-        footer = None
-
-        for colour_hex, svg_path in self.colour_svgs.items():
-            temp_gcode = f"{svg_path}.gcode"
-
-            converter = SvgToGCode(
-                svg_file=svg_path,
-                output_file=temp_gcode,
-                scale_factor=self.scale_factor,
-                line_segments=self.line_segments,
-                retraction_height=self.retraction_height,
-                plot_height=self.plot_height,
-                max_x=self.max_x,
-                max_y=self.max_y,
-                pen_offset_y=self.pen_offset_y
-            )
-
-            converter.run()
-
-            with open(temp_gcode, "r") as f:
-                lines = f.read().splitlines()
-
-            if header is None:
-                header, body, footer = self._extract_header_footer(lines)
-            else:
-                _, body, _ = self._extract_header_footer(lines)
-
-            # If body is empty → no paths found
-            if not body:
-                raise ValueError(f"No paths found for colour #{colour_hex}. Cannot continue.")
-
-            blocks[colour_hex] = body
-
-        return header, blocks, footer
+    def _converter_args(self, colour_hex):
+        layer = self.colour_layers[colour_hex]
+        is_file = isinstance(layer, (str, os.PathLike))
+        return dict(
+            svg_file=layer if is_file else None,
+            shapes=None if is_file else layer,
+            scale_factor=self.scale_factor,
+            retraction_height=self.retraction_height,
+            plot_height=self.plot_height,
+            max_x=self.max_x,
+            max_y=self.max_y,
+            pen_offset_y=self.pen_offset_y,
+            options=self.options
+        )
+
+    def _iter_colour_results(self, colours, spool_dir=None, start=START_STATE):
+        """Yield (colour, SpooledLayer, error) for each colour, in the order given.
+
+        With more than one worker the layers are converted in a process pool
+        and collected in order; otherwise they run here one at a time."""
+        jobs = []
+        for c in colours:
+            try:
+                jobs.append((c, self._converter_args(c)))
+            except KeyError:
+                jobs.append((c, None))
+
+        workers = min(self.workers, len(jobs))
+        if workers <= 1:
+            for c, args in jobs:
+                yield (c,) + convert_colour(args, spool_dir, start)
+            return
+
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [(c, pool.submit(convert_colour, args, spool_dir, start)) for c, args in jobs]
+            try:
+                for c, future in futures:
+                    try:
+                        yield (c,) + future.result()
+                    except Exception as e:
+                        # The worker itself died (e.g. killed or out of memory)
+                        yield c, None, f"{type(e).__name__}: {e}"
+            finally:
+                for _, future in futures:
+                    future.cancel()
 
     # -------------------------------------------------------------
     # Assemble final G‑code
     # -------------------------------------------------------------
-    def assemble(self):
-        header, blocks, footer = self._convert_each_colour()
-
+    def _dock_groups(self):
         # Group colours by dock position, skipping dock=0
         dock_groups = {}
         for colour_hex, dock in self.dock_positions.items():
             if dock == 0:
                 continue
             dock_groups.setdefault(dock, []).append(colour_hex)
+        return dock_groups
+
+    def program(self):
+        """The whole job as one GCodeProgram; colour layers are spliced in as blocks"""
+        return GCodeProgram(
+            initial_sequence(self.plot_height, self.retraction_height),
+            self.iter_blocks(),
+            end_sequence(),
+            self.stats
+        )
+
+    def _plan(self, dock_groups, layers, prime):
+        """Dock groups in drawing order, as [(dock, [colours])], docks with nothing to
+        draw last; records the time estimate"""
+        planner = ToolChangePlanner(
+            pickup=lambda dock: self.get_pickup_sequence(self.get_docker_x_position(dock)),
+            dropoff=lambda dock: self.get_dropoff_sequence(self.get_docker_x_position(dock)),
+            prime=prime,
+            layers={c: (layer.seconds, layer.end) for c, layer in layers.items() if layer is not None},
+            header=initial_sequence(self.plot_height, self.retraction_height)
+        )
+
+        # Failed layers take no time; they keep their place at the end of their group,
+        # and a dock with nothing left to draw is not visited at all
+        drawn = [(dock, [c for c in colours if layers[c] is not None]) for dock, colours in dock_groups.items()]
+        drawn = [(dock, colours) for dock, colours in drawn if colours]
+        given = planner.estimate(drawn)
+
+        if self.options.plan_tool_changes:
+            plan, estimate = planner.plan(drawn)
+            print(f"Estimated time: {given / 60:.1f}min -> {estimate / 60:.1f}min (tool-change planning)")
+            self.stats["estimated_time_unplanned_s"] = given
+        else:
+            plan, estimate = drawn, given
+            print(f"Estimated time: {estimate / 60:.1f}min")
+        self.stats["estimated_time_s"] = estimate
+
+        failed = {dock: [c for c in colours if layers[c] is None] for dock, colours in dock_groups.items()}
+        planned = [dock for dock, _ in plan]
+        return ([(dock, colours + failed[dock]) for dock, colours in plan] +
+                [(dock, failed[dock]) for dock in dock_groups if dock not in planned])
+
+    def iter_blocks(self):
+        prime = prime_sequence(self.plot_height, self.retraction_height, self.pen_offset_y)
+        # Every prime leaves the head in the same place, so strokes are timed from there
+        _, after_prime = estimate_time(prime)
+        dock_groups = self._dock_groups()
+
+        with tempfile.TemporaryDirectory(prefix="layers-") as spool_dir:
+            # Every layer is converted before planning, which needs their first and last strokes;
+            # their G-code waits on disk meanwhile
+            layers, errors = {}, {}
+            colours = [c for colours in dock_groups.values() for c in colours]
+            for c, layer, error in self._iter_colour_results(colours, spool_dir, after_prime):
+                if layer is not None and not layer.strokes:
+                    # Nothing to draw: an error, not a pen visit with only a prime
+                    layer, error = None, f"ValueError: No paths found for colour #{c}"
+                    self.empty.add(c)
+                layers[c], errors[c] = layer, error
+
+            # Process each dock group
+            for dock, colours in self._plan(dock_groups, layers, prime):
+                x_pos = self.get_docker_x_position(dock)
+                visit = any(layers[c] is not None for c in colours)
+                if visit:
+                    yield ([f"; Pick up pens at dock {dock} for colours: " + ", ".join(f"#{c}" for c in colours)] +
+                           self.get_pickup_sequence(x_pos))
+
+                for c in colours:
+                    layer, error = layers[c], errors[c]
+                    if error is not None:
+                        # One bad layer must not cost the others their work
+                        self.errors[c] = error
+                        print(f"Colour #{c} failed: {error}")
+                        yield [f"; Skipped colour #{c}: conversion failed"]
+                        continue
+
+                    yield [f"; Drawing colour #{c}"] + prime
+                    yield from layer.blocks()
+
+                    # Per-colour counters add up to job totals
+                    for key, value in layer.stats.items():
+                        self.stats[key] = self.stats.get(key, 0) + value
+
+                if visit:
+                    yield [f"; Drop off pens at dock {dock}"] + self.get_dropoff_sequence(x_pos)
+
+    def iter_gcode(self):
+        lines = self.program().lines()
+        if self.options.compact_gcode:
+            # One pass over the whole file, so pen swaps are compacted too
+            lines = compact(lines, self.stats)
+        yield from lines
 
-        final = []
-        final.extend(header)
-
-        # Process each dock group
-        for dock, colours in dock_groups.items():
-            final.append(f"; Pick up pens at dock {dock} for colours: " +
-                         ", ".join(f"#{c}" for c in colours))
-            x_pos = self.get_docker_x_position(dock)
-            final.extend(self.get_pickup_sequence(x_pos))
-
-            for c in colours:
-                final.append(f"; Drawing colour #{c}")
-                final.extend(blocks[c])
-
-            final.append(f"; Drop off pens at dock {dock}")
-            final.extend(self.get_dropoff_sequence(x_pos))
-
-        final.extend(footer)
-
+    def assemble(self):
         with open(self.output_file, "w") as f:
-            f.write("\n".join(final))
+            write_lines(self.iter_gcode(), f)
 
         print(f"\nSaved multicolour G‑code to {self.output_file}")
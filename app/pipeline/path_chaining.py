@@ -0,0 +1,86 @@
+# path_chaining.py
+import numpy as np
+
+
+class PathChainer:
+    """
+    Joins flattened paths whose endpoints meet (within `tolerance`) into longer
+    continuous strokes, reversing paths where needed, so the pen does not lift
+    between them. Endpoints are found through a spatial hash with cells the
+    size of the tolerance.
+    """
+
+    def __init__(self, polylines, tolerance):
+        self.polylines = [p for p in polylines if len(p) > 0]
+        self.tolerance = tolerance
+        self.cell = max(tolerance, 1e-9)
+
+        self.buckets = {}
+        for i, p in enumerate(self.polylines):
+            self._insert(p[0], (i, 0))
+            self._insert(p[-1], (i, 1))
+
+        self.used = np.zeros(len(self.polylines), dtype=bool)
+
+    def _key(self, point):
+        return (int(np.floor(point.real / self.cell)), int(np.floor(point.imag / self.cell)))
+
+    def _insert(self, point, item):
+        self.buckets.setdefault(self._key(point), []).append(item)
+
+    def _find(self, point):
+        """Closest unused path endpoint within tolerance: (path, 0=start / 1=end)"""
+        kx, ky = self._key(point)
+        best = None
+        best_d = self.tolerance
+
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                for i, side in self.buckets.get((kx + dx, ky + dy), ()):
+                    if self.used[i]:
+                        continue
+                    p = self.polylines[i]
+                    d = abs((p[0] if side == 0 else p[-1]) - point)
+                    if d <= best_d:
+                        best, best_d = (i, side), d
+
+        return best
+
+    def chain(self):
+        """Return the chained strokes, in the order of their first path"""
+        chains = []
+
+        for i, polyline in enumerate(self.polylines):
+            if self.used[i]:
+                continue
+            self.used[i] = True
+
+            pieces = [polyline]
+
+            # Grow forwards from the tail
+            tail = polyline[-1]
+            while True:
+                found = self._find(tail)
+                if found is None:
+                    break
+                j, side = found
+                self.used[j] = True
+                p = self.polylines[j] if side == 0 else self.polylines[j][::-1]
+                pieces.append(p[1:] if p[0] == tail else p)
+                tail = p[-1]
+
+            # Grow backwards from the head
+            head = polyline[0]
+            while True:
+                found = self._find(head)
+                if found is None:
+                    break
+                j, side = found
+                self.used[j] = True
+                p = self.polylines[j] if side == 1 else self.polylines[j][::-1]
+                pieces.insert(0, p[:-1] if p[-1] == head else p)
+                head = p[0]
+
+            chains.append(np.concatenate(pieces) if len(pieces) > 1 else polyline)
+
+        return chains
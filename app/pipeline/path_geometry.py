@@ -0,0 +1,408 @@
+# path_geometry.py
+import numpy as np
+from svgpathtools import QuadraticBezier, CubicBezier, Arc
+
+# Upper bound on samples per segment in adaptive flattening
+MAX_ADAPTIVE_SAMPLES = 500
+
+# Segment type codes
+LINE = 0
+QUAD = 1
+CUBIC = 2
+ARC = 3
+
+
+class PathStats:
+    """
+    Per-path summary over segment endpoints, one row per path:
+    - bbox: (n_paths, 4) min_x, min_y, max_x, max_y (NaN for empty paths)
+    - centroid: mean of segment start and end points (NaN for empty paths)
+    - first / last: start of the first segment and end of the last one
+    - segments: segment count
+
+    Computed once, re-sliced by PathGeometry.take and moved along with the
+    geometry by its affine operations instead of being rebuilt.
+    """
+
+    def __init__(self, bbox, centroid, first, last, segments):
+        self.bbox = bbox
+        self.centroid = centroid
+        self.first = first
+        self.last = last
+        self.segments = segments
+
+    @classmethod
+    def compute(cls, geometry):
+        counts = geometry.segment_counts()
+        has = counts > 0
+        firsts = geometry.path_offsets[:-1][has]
+        lasts = geometry.path_offsets[1:][has] - 1
+
+        first = np.full(len(geometry), np.nan, dtype=complex)
+        last = np.full(len(geometry), np.nan, dtype=complex)
+        first[has] = geometry.starts[firsts]
+        last[has] = geometry.ends[lasts]
+
+        sums = np.zeros(len(geometry), dtype=complex)
+        np.add.at(sums, geometry.path_index(), geometry.starts + geometry.ends)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            centroid = sums / (2 * counts)
+
+        return cls(cls.compute_bounds(geometry), centroid, first, last, counts)
+
+    @staticmethod
+    def compute_bounds(geometry):
+        out = np.full((len(geometry), 4), np.nan)
+        if geometry.n_segments == 0:
+            return out
+
+        has = geometry.segment_counts() > 0
+        idx = geometry.path_offsets[:-1][has]
+
+        xs = (geometry.starts.real, geometry.ends.real)
+        ys = (geometry.starts.imag, geometry.ends.imag)
+        out[has, 0] = np.minimum(np.minimum.reduceat(xs[0], idx), np.minimum.reduceat(xs[1], idx))
+        out[has, 1] = np.minimum(np.minimum.reduceat(ys[0], idx), np.minimum.reduceat(ys[1], idx))
+        out[has, 2] = np.maximum(np.maximum.reduceat(xs[0], idx), np.maximum.reduceat(xs[1], idx))
+        out[has, 3] = np.maximum(np.maximum.reduceat(ys[0], idx), np.maximum.reduceat(ys[1], idx))
+        return out
+
+    def take(self, indices):
+        return PathStats(
+            bbox=self.bbox[indices] if self.bbox is not None else None,
+            centroid=self.centroid[indices],
+            first=self.first[indices],
+            last=self.last[indices],
+            segments=self.segments[indices],
+        )
+
+    def affine(self, a, b, c, d, e, f):
+        """Follow an affine map given per path (arrays) or for all paths (scalars).
+
+        Points map exactly. The bbox maps exactly while the map keeps axes
+        aligned (b = c = 0); otherwise it is dropped and rebuilt on demand."""
+        self.centroid = PathGeometry._affine(self.centroid, a, b, c, d, e, f)
+        self.first = PathGeometry._affine(self.first, a, b, c, d, e, f)
+        self.last = PathGeometry._affine(self.last, a, b, c, d, e, f)
+
+        if self.bbox is None:
+            return
+        if np.any(b != 0) or np.any(c != 0):
+            self.bbox = None
+            return
+
+        x0, y0, x1, y1 = self.bbox.T
+        xs = (a * x0 + e, a * x1 + e)
+        ys = (d * y0 + f, d * y1 + f)
+        self.bbox = np.stack((np.minimum(*xs), np.minimum(*ys),
+                              np.maximum(*xs), np.maximum(*ys)), axis=1)
+
+
+class PathGeometry:
+    """
+    Segments of many paths packed into flat NumPy arrays:
+    - kinds: segment type code per segment
+    - ctrl: (n_segments, 4) complex control points, start in column 0 and
+      end in column 3 for every kind (unused columns repeat an endpoint)
+    - path_offsets: segments of path i are path_offsets[i]:path_offsets[i + 1]
+    - arc_seg / arc_ctrl / arc_angles: arcs as centre C, points C+U and C+V,
+      and start angle / sweep in radians, so point(a) = C + U cos(a) + V sin(a)
+
+    Per-path bounds, centroids and endpoints live in a PathStats index that
+    is built on first use and kept current by every operation below.
+    """
+
+    def __init__(self, kinds, ctrl, path_offsets, arc_seg=None, arc_ctrl=None, arc_angles=None,
+                 stats=None):
+        self.kinds = kinds
+        self.ctrl = ctrl
+        self.path_offsets = path_offsets
+        self.arc_seg = arc_seg if arc_seg is not None else np.zeros(0, dtype=np.int64)
+        self.arc_ctrl = arc_ctrl if arc_ctrl is not None else np.zeros((0, 3), dtype=complex)
+        self.arc_angles = arc_angles if arc_angles is not None else np.zeros((0, 2))
+        self._stats = stats
+
+    @classmethod
+    def from_paths(cls, paths):
+        """Pack svgpathtools paths (or lists of segments) into arrays"""
+        kinds = []
+        ctrl = []
+        arc_seg = []
+        arc_ctrl = []
+        arc_angles = []
+        path_offsets = [0]
+
+        for path in paths:
+            for seg in path:
+                if isinstance(seg, CubicBezier):
+                    kinds.append(CUBIC)
+                    ctrl.append((seg.start, seg.control1, seg.control2, seg.end))
+                elif isinstance(seg, QuadraticBezier):
+                    kinds.append(QUAD)
+                    ctrl.append((seg.start, seg.control, seg.control, seg.end))
+                elif isinstance(seg, Arc):
+                    kinds.append(ARC)
+                    ctrl.append((seg.start, seg.start, seg.end, seg.end))
+                    u = seg.radius.real * seg.rot_matrix
+                    v = 1j * seg.radius.imag * seg.rot_matrix
+                    arc_seg.append(len(kinds) - 1)
+                    arc_ctrl.append((seg.center, seg.center + u, seg.center + v))
+                    arc_angles.append((np.radians(seg.theta), np.radians(seg.delta)))
+                else:
+                    kinds.append(LINE)
+                    ctrl.append((seg.start, seg.start, seg.end, seg.end))
+            path_offsets.append(len(kinds))
+
+        return cls(
+            kinds=np.array(kinds, dtype=np.int8),
+            ctrl=np.array(ctrl, dtype=complex).reshape(-1, 4),
+            path_offsets=np.array(path_offsets, dtype=np.int64),
+            arc_seg=np.array(arc_seg, dtype=np.int64),
+            arc_ctrl=np.array(arc_ctrl, dtype=complex).reshape(-1, 3),
+            arc_angles=np.array(arc_angles, dtype=float).reshape(-1, 2),
+        )
+
+    def __len__(self):
+        return len(self.path_offsets) - 1
+
+    @property
+    def n_segments(self):
+        return len(self.kinds)
+
+    @property
+    def starts(self):
+        return self.ctrl[:, 0]
+
+    @property
+    def ends(self):
+        return self.ctrl[:, 3]
+
+    def segment_counts(self):
+        return np.diff(self.path_offsets)
+
+    def path_index(self):
+        """Index of the owning path for every segment"""
+        return np.repeat(np.arange(len(self)), self.segment_counts())
+
+    @property
+    def stats(self):
+        """The per-path PathStats index, computed on first use"""
+        if self._stats is None:
+            self._stats = PathStats.compute(self)
+        elif self._stats.bbox is None:
+            self._stats.bbox = PathStats.compute_bounds(self)
+        return self._stats
+
+    # -------------------------------------------------------------
+    # Affine operations on every control point at once
+    # -------------------------------------------------------------
+    def apply_matrix(self, m):
+        """Apply one 3x3 affine matrix to the whole drawing"""
+        a, c, e = m[0]
+        b, d, f = m[1]
+        self.ctrl = self._affine(self.ctrl, a, b, c, d, e, f)
+        self.arc_ctrl = self._affine(self.arc_ctrl, a, b, c, d, e, f)
+        if self._stats is not None:
+            self._stats.affine(a, b, c, d, e, f)
+
+    def apply_path_matrices(self, matrices):
+        """Apply a separate 3x3 affine matrix to each path, shape (n_paths, 3, 3)"""
+        if self._stats is not None:
+            self._stats.affine(*(matrices[:, i, j] for i, j in ((0, 0), (1, 0), (0, 1), (1, 1), (0, 2), (1, 2))))
+
+        per_seg = matrices[self.path_index()]
+        a, c, e = per_seg[:, 0, 0], per_seg[:, 0, 1], per_seg[:, 0, 2]
+        b, d, f = per_seg[:, 1, 0], per_seg[:, 1, 1], per_seg[:, 1, 2]
+        self.ctrl = self._affine(self.ctrl, *(v[:, None] for v in (a, b, c, d, e, f)))
+
+        if len(self.arc_seg):
+            arc_m = per_seg[self.arc_seg]
+            self.arc_ctrl = self._affine(
+                self.arc_ctrl,
+                *(arc_m[:, i, j][:, None] for i, j in ((0, 0), (1, 0), (0, 1), (1, 1), (0, 2), (1, 2)))
+            )
+
+    @staticmethod
+    def _affine(points, a, b, c, d, e, f):
+        x = points.real
+        y = points.imag
+        return (a * x + c * y + e) + 1j * (b * x + d * y + f)
+
+    def transformed_bounds(self, matrices):
+        """Global bounds of the segment endpoints as they would be after
+        apply_path_matrices(matrices), without transforming any control points"""
+        if self.n_segments == 0:
+            return None
+
+        per_seg = matrices[self.path_index()]
+        coeffs = [per_seg[:, i, j] for i, j in ((0, 0), (1, 0), (0, 1), (1, 1), (0, 2), (1, 2))]
+        pts = np.concatenate((self._affine(self.starts, *coeffs), self._affine(self.ends, *coeffs)))
+        return pts.real.min(), pts.imag.min(), pts.real.max(), pts.imag.max()
+
+    def translate(self, offset):
+        self.ctrl += offset
+        self.arc_ctrl += offset
+        if self._stats is not None:
+            self._stats.affine(1.0, 0.0, 0.0, 1.0, offset.real, offset.imag)
+
+    def scale(self, factor):
+        self.ctrl *= factor
+        self.arc_ctrl *= factor
+        if self._stats is not None:
+            self._stats.affine(factor, 0.0, 0.0, factor, 0.0, 0.0)
+
+    # -------------------------------------------------------------
+    # Per-path measurements over segment endpoints
+    # -------------------------------------------------------------
+    def bounds(self):
+        """Global (min_x, min_y, max_x, max_y) of all segment endpoints, or None"""
+        if self.n_segments == 0:
+            return None
+        bbox = self.stats.bbox
+        return (np.nanmin(bbox[:, 0]), np.nanmin(bbox[:, 1]),
+                np.nanmax(bbox[:, 2]), np.nanmax(bbox[:, 3]))
+
+    def path_bounds(self):
+        """(n_paths, 4) array of min_x, min_y, max_x, max_y; NaN for empty paths"""
+        return self.stats.bbox
+
+    def path_centroids(self):
+        """Mean of segment start and end points per path; NaN for empty paths"""
+        return self.stats.centroid
+
+    def path_keys(self, decimals=4):
+        """Hashable key per path from its rounded segment endpoints"""
+        coords = np.stack((self.starts.real, self.starts.imag, self.ends.real, self.ends.imag), axis=1)
+        # + 0.0 folds -0.0 into 0.0 so equal points give equal bytes
+        coords = np.round(coords, decimals) + 0.0
+        return [coords[a:b].tobytes() for a, b in zip(self.path_offsets[:-1], self.path_offsets[1:])]
+
+    def gaps(self, threshold):
+        """Boolean per segment: starts more than threshold away from the previous
+        segment's end within the same path"""
+        gap = np.zeros(self.n_segments, dtype=bool)
+        if self.n_segments > 1:
+            gap[1:] = np.abs(self.starts[1:] - self.ends[:-1]) > threshold
+        gap[self.path_offsets[:-1][self.path_offsets[:-1] < self.n_segments]] = False
+        return gap
+
+    # -------------------------------------------------------------
+    # Re-slicing paths without touching segment data
+    # -------------------------------------------------------------
+    def take(self, indices):
+        """New geometry holding the given paths, in the given order"""
+        indices = np.asarray(indices, dtype=np.int64)
+        firsts = self.path_offsets[:-1][indices]
+        counts = self.segment_counts()[indices]
+        new_offsets = np.concatenate(([0], np.cumsum(counts)))
+
+        seg_ids = np.repeat(firsts - new_offsets[:-1], counts) + np.arange(new_offsets[-1])
+
+        new_index = np.full(self.n_segments, -1, dtype=np.int64)
+        new_index[seg_ids] = np.arange(len(seg_ids))
+        keep = new_index[self.arc_seg] >= 0 if len(self.arc_seg) else np.zeros(0, dtype=bool)
+
+        return PathGeometry(
+            kinds=self.kinds[seg_ids],
+            ctrl=self.ctrl[seg_ids],
+            path_offsets=new_offsets,
+            arc_seg=new_index[self.arc_seg[keep]],
+            arc_ctrl=self.arc_ctrl[keep],
+            arc_angles=self.arc_angles[keep],
+            stats=self._stats.take(indices) if self._stats is not None else None,
+        )
+
+    def split_before(self, breaks):
+        """Start a new path at every segment flagged in `breaks`"""
+        cuts = np.flatnonzero(breaks)
+        self.path_offsets = np.union1d(self.path_offsets, cuts).astype(np.int64)
+        self._stats = None
+
+    # -------------------------------------------------------------
+    # Flattening: every sample of every segment in one batch
+    # -------------------------------------------------------------
+    def _power_coefficients(self):
+        """Horner coefficients c0..c3 per segment: p(t) = c0 + t(c1 + t(c2 + t c3))"""
+        p0, p1, p2, p3 = self.ctrl.T
+        coef = np.zeros((4, self.n_segments), dtype=complex)
+        coef[0] = p0
+
+        line = self.kinds == LINE
+        coef[1, line] = p3[line] - p0[line]
+
+        quad = self.kinds == QUAD
+        coef[1, quad] = 2 * (p1[quad] - p0[quad])
+        coef[2, quad] = p0[quad] - 2 * p1[quad] + p3[quad]
+
+        cubic = self.kinds == CUBIC
+        coef[1, cubic] = 3 * (p1[cubic] - p0[cubic])
+        coef[2, cubic] = 3 * (p0[cubic] + p2[cubic]) - 6 * p1[cubic]
+        coef[3, cubic] = -p0[cubic] + 3 * (p1[cubic] - p2[cubic]) + p3[cubic]
+
+        return coef
+
+    def adaptive_samples(self, tolerance):
+        """Sample count per segment so the chord never strays more than
+        `tolerance` from the curve.
+
+        Uses the bound max|p''| * h^2 / 8 for a chord over a parameter step h.
+        Lines always get a single chord."""
+        p0, p1, p2, p3 = self.ctrl.T
+        curvature = np.zeros(self.n_segments)
+
+        quad = self.kinds == QUAD
+        curvature[quad] = 2 * np.abs(p0[quad] - 2 * p1[quad] + p3[quad])
+
+        cubic = self.kinds == CUBIC
+        curvature[cubic] = 6 * np.maximum(np.abs(p0[cubic] - 2 * p1[cubic] + p2[cubic]),
+                                          np.abs(p1[cubic] - 2 * p2[cubic] + p3[cubic]))
+
+        if len(self.arc_seg):
+            centre, cu, cv = self.arc_ctrl.T
+            radius = np.hypot(np.abs(cu - centre), np.abs(cv - centre))
+            curvature[self.arc_seg] = radius * self.arc_angles[:, 1] ** 2
+
+        steps = np.ceil(np.sqrt(curvature / (8 * tolerance)))
+        return np.clip(steps, 1, MAX_ADAPTIVE_SAMPLES - 1).astype(np.int64) + 1
+
+    def flatten(self, samples, skip_joints=False):
+        """Sample every segment at np.linspace(0, 1, n) and return one complex
+        polyline array per path.
+
+        samples is either a single count for all segments or an array with a
+        count per segment. With skip_joints, the t=0 sample of a segment that
+        starts where the previous one ended is left out."""
+        if len(self) == 0:
+            return []
+
+        counts = np.broadcast_to(np.asarray(samples, dtype=np.int64), (self.n_segments,))
+        steps = np.maximum(counts - 1, 1)
+
+        skip = np.zeros(self.n_segments, dtype=np.int64)
+        if skip_joints and self.n_segments > 1:
+            joined = np.abs(self.ctrl[1:, 0] - self.ctrl[:-1, 3]) <= 1e-9
+            skip[1:] = joined & (counts[1:] > 1)
+            skip[self.path_offsets[:-1][self.path_offsets[:-1] < self.n_segments]] = 0
+
+        counts = counts - skip
+        seg_starts = np.concatenate(([0], np.cumsum(counts)))
+        total = int(seg_starts[-1])
+
+        seg_idx = np.repeat(np.arange(self.n_segments), counts)
+        local = np.arange(total) - seg_starts[seg_idx] + skip[seg_idx]
+        t = local / steps[seg_idx]
+
+        c0, c1, c2, c3 = self._power_coefficients()
+        points = c0[seg_idx] + t * (c1[seg_idx] + t * (c2[seg_idx] + t * c3[seg_idx]))
+
+        if len(self.arc_seg):
+            arc_lookup = np.full(self.n_segments, -1, dtype=np.int64)
+            arc_lookup[self.arc_seg] = np.arange(len(self.arc_seg))
+            on_arc = arc_lookup[seg_idx]
+            mask = on_arc >= 0
+            a = on_arc[mask]
+            centre, cu, cv = self.arc_ctrl[a].T
+            angle = self.arc_angles[a, 0] + t[mask] * self.arc_angles[a, 1]
+            points[mask] = centre + (cu - centre) * np.cos(angle) + (cv - centre) * np.sin(angle)
+
+        return np.split(points, seg_starts[self.path_offsets[1:-1]])
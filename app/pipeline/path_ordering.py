@@ -0,0 +1,205 @@
+# path_ordering.py
+import time
+import numpy as np
+
+# Below this many remaining entries a brute-force scan beats growing grid rings
+BRUTE_FORCE_ENTRIES = 256
+
+
+class EndpointGrid:
+    """Uniform grid over candidate entry points, with removal, for nearest-point queries"""
+
+    def __init__(self, points):
+        self.points = points
+        self.alive = np.ones(len(points), dtype=bool)
+        self.count = len(points)
+
+        xs, ys = points.real, points.imag
+        self.min_x = xs.min()
+        self.min_y = ys.min()
+        extent = max(xs.max() - self.min_x, ys.max() - self.min_y, 1e-9)
+        self.cell = extent / max(np.sqrt(len(points)), 1.0)
+
+        ix = np.floor((xs - self.min_x) / self.cell).astype(np.int64)
+        iy = np.floor((ys - self.min_y) / self.cell).astype(np.int64)
+        self.size_x = int(ix.max()) + 1
+        self.size_y = int(iy.max()) + 1
+
+        self.keys = list(zip(ix.tolist(), iy.tolist()))
+        self.cells = {}
+        for entry, key in enumerate(self.keys):
+            self.cells.setdefault(key, []).append(entry)
+
+    def remove(self, entries):
+        for entry in entries:
+            if self.alive[entry]:
+                self.alive[entry] = False
+                self.count -= 1
+
+    def nearest(self, pos):
+        """Entry closest to pos, or None when the grid is empty"""
+        if self.count == 0:
+            return None
+        if self.count <= BRUTE_FORCE_ENTRIES:
+            return self._brute_force(pos)
+
+        cx = int(np.floor((pos.real - self.min_x) / self.cell))
+        cy = int(np.floor((pos.imag - self.min_y) / self.cell))
+        max_r = max(abs(cx), abs(self.size_x - 1 - cx), abs(cy), abs(self.size_y - 1 - cy))
+
+        best = None
+        best_d = np.inf
+        visited_cells = 0
+
+        for r in range(max_r + 1):
+            # Everything in ring r is at least (r - 1) cells away
+            if best is not None and best_d <= (r - 1) * self.cell:
+                break
+
+            # Sparse grid late in the run: scanning what is left is cheaper
+            visited_cells += 8 * r + 1
+            if visited_cells > 4 * self.count:
+                return self._brute_force(pos)
+
+            for key in self._ring(cx, cy, r):
+                for entry in self.cells.get(key, ()):
+                    if not self.alive[entry]:
+                        continue
+                    d = abs(self.points[entry] - pos)
+                    if d < best_d:
+                        best, best_d = entry, d
+
+        return best
+
+    def _brute_force(self, pos):
+        alive = np.flatnonzero(self.alive)
+        return int(alive[np.argmin(np.abs(self.points[alive] - pos))])
+
+    @staticmethod
+    def _ring(cx, cy, r):
+        if r == 0:
+            yield (cx, cy)
+            return
+        for dx in range(-r, r + 1):
+            yield (cx + dx, cy - r)
+            yield (cx + dx, cy + r)
+        for dy in range(-r + 1, r):
+            yield (cx - r, cy + dy)
+            yield (cx + r, cy + dy)
+
+
+class PathOrderer:
+    """
+    Orders flattened paths to cut pen-up travel:
+    - greedy nearest neighbour over a grid index of path entry points
+    - open paths may be drawn in either direction
+    - closed loops may start at any of up to `max_seams` evenly spaced vertices
+    - optional 2-opt improvement (which also flips paths) under a time budget
+    """
+
+    def __init__(self, polylines, max_seams=32, closed_tolerance=1e-6):
+        self.polylines = [p for p in polylines if len(p) > 0]
+        self.max_seams = max_seams
+        self.closed = [len(p) > 2 and abs(p[0] - p[-1]) <= closed_tolerance for p in self.polylines]
+
+    @staticmethod
+    def travel(polylines, start=0j):
+        """Total pen-up distance to draw polylines in this order and direction"""
+        polylines = [p for p in polylines if len(p) > 0]
+        if not polylines:
+            return 0.0
+        starts = np.array([p[0] for p in polylines])
+        ends = np.array([p[-1] for p in polylines])
+        previous = np.concatenate(([start], ends[:-1]))
+        return float(np.abs(starts - previous).sum())
+
+    def order(self, start=0j, time_budget=1.0):
+        """Return the polylines re-ordered, and re-oriented, for low travel"""
+        if not self.polylines:
+            return []
+
+        route = self._greedy(start)
+        if time_budget > 0 and len(route) > 1:
+            route = self._two_opt(route, start, time_budget)
+        return route
+
+    # -------------------------------------------------------------
+    # Greedy nearest neighbour
+    # -------------------------------------------------------------
+    def _entry_vertices(self, i):
+        p = self.polylines[i]
+        if self.closed[i]:
+            n = len(p) - 1
+            return np.unique(np.linspace(0, n - 1, min(n, self.max_seams)).astype(np.int64))
+        if len(p) == 1:
+            return np.array([0])
+        return np.array([0, len(p) - 1])
+
+    def _oriented(self, i, vertex):
+        p = self.polylines[i]
+        if self.closed[i]:
+            # Rotate the loop so it starts (and ends) at the chosen seam
+            return np.concatenate((p[vertex:-1], p[:vertex + 1])) if vertex else p
+        return p[::-1] if vertex else p
+
+    def _greedy(self, start):
+        vertices = [self._entry_vertices(i) for i in range(len(self.polylines))]
+        points = np.concatenate([self.polylines[i][v] for i, v in enumerate(vertices)])
+        owner = np.repeat(np.arange(len(vertices)), [len(v) for v in vertices])
+        vertex = np.concatenate(vertices)
+
+        firsts = np.concatenate(([0], np.cumsum([len(v) for v in vertices])))
+        grid = EndpointGrid(points)
+
+        route = []
+        pos = start
+        while True:
+            entry = grid.nearest(pos)
+            if entry is None:
+                break
+
+            i = int(owner[entry])
+            grid.remove(range(firsts[i], firsts[i + 1]))
+
+            polyline = self._oriented(i, int(vertex[entry]))
+            route.append(polyline)
+            pos = polyline[-1]
+
+        return route
+
+    # -------------------------------------------------------------
+    # 2-opt: reverse a run of paths when that shortens the two links around it
+    # -------------------------------------------------------------
+    def _two_opt(self, route, start, time_budget):
+        deadline = time.perf_counter() + time_budget
+        starts = np.array([p[0] for p in route])
+        ends = np.array([p[-1] for p in route])
+        n = len(route)
+
+        improved = True
+        while improved and time.perf_counter() < deadline:
+            improved = False
+
+            for i in range(n):
+                if time.perf_counter() >= deadline:
+                    break
+
+                a = start if i == 0 else ends[i - 1]
+                b = starts[i]
+                c = ends[i:]
+                d = np.append(starts[i + 1:], np.nan)
+                last = np.isnan(d)
+
+                # Reversing route[i..j] swaps links (a-b, c-d) for (a-c, b-d)
+                old = np.abs(a - b) + np.where(last, 0.0, np.abs(c - d))
+                new = np.abs(a - c) + np.where(last, 0.0, np.abs(b - d))
+                delta = new - old
+
+                k = int(np.argmin(delta))
+                if delta[k] < -1e-9:
+                    j = i + k
+                    route[i:j + 1] = [p[::-1] for p in reversed(route[i:j + 1])]
+                    starts[i:j + 1], ends[i:j + 1] = ends[i:j + 1][::-1].copy(), starts[i:j + 1][::-1].copy()
+                    improved = True
+
+        return route
@@ -0,0 +1,190 @@
+# path_overlap.py
+import numpy as np
+
+# Grid cell (mm) of the bounding-box index
+GRID_CELL = 10.0
+
+# Distances are computed in blocks of at most this many point/segment pairs
+MAX_PAIRS = 2_000_000
+
+
+class BoxGrid:
+    """Uniform grid over bounding boxes: every box is listed in each cell it touches"""
+
+    def __init__(self, cell=GRID_CELL):
+        self.cell = cell
+        self.cells = {}
+
+    def _range(self, box):
+        x0, y0, x1, y1 = (int(np.floor(v / self.cell)) for v in box)
+        return range(x0, x1 + 1), range(y0, y1 + 1)
+
+    def insert(self, item, box):
+        xs, ys = self._range(box)
+        for x in xs:
+            for y in ys:
+                self.cells.setdefault((x, y), []).append(item)
+
+    def query(self, box):
+        xs, ys = self._range(box)
+        found = set()
+        for x in xs:
+            for y in ys:
+                found.update(self.cells.get((x, y), ()))
+        return sorted(found)
+
+
+def _segment_distances(points, a, b):
+    """Distance from each point to the nearest of the segments a[k] -> b[k]"""
+    best = np.full(len(points), np.inf)
+    if len(a) == 0:
+        return best
+
+    d = b - a
+    length2 = np.abs(d) ** 2
+    block = max(1, MAX_PAIRS // len(a))
+
+    for i in range(0, len(points), block):
+        p = points[i:i + block, None]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            t = np.where(length2 > 0, (np.conj(d) * (p - a)).real / length2, 0.0)
+        nearest = a + np.clip(t, 0.0, 1.0) * d
+        best[i:i + block] = np.abs(p - nearest).min(axis=1)
+
+    return best
+
+
+class OverlapRemover:
+    """
+    Removes strokes, or stretches of strokes, that retrace something already
+    drawn. Paths are taken in drawing order; each one is sampled every
+    `tolerance` mm and the samples are tested against the segments of the
+    strokes kept so far, found through a grid of their bounding boxes.
+
+    - a path whose every sample lies within `tolerance` of kept strokes is
+      dropped (exact, reversed and differently-transformed duplicates, fill
+      and stroke outlines of the same shape)
+    - a covered stretch at least `min_overlap` mm long is cut out and the
+      rest of the path is kept (partial overlaps); shorter stretches, such as
+      crossings and touching ends, are left alone
+    """
+
+    def __init__(self, polylines, tolerance, min_overlap=None):
+        self.polylines = polylines
+        self.tolerance = tolerance
+        self.min_overlap = 20 * tolerance if min_overlap is None else min_overlap
+
+        self.grid = BoxGrid()
+        self.kept_a = []
+        self.kept_b = []
+
+        self.paths_removed = 0
+        self.length_removed = 0.0
+
+    # -------------------------------------------------------------
+    # Sampling
+    # -------------------------------------------------------------
+    def _samples(self, points):
+        """Points every `tolerance` along the polyline, with their segment and position on it"""
+        seg = np.diff(points)
+        steps = np.maximum(np.ceil(np.abs(seg) / self.tolerance).astype(np.int64), 1)
+
+        owner = np.repeat(np.arange(len(seg)), steps)
+        firsts = np.concatenate(([0], np.cumsum(steps)[:-1]))
+        t = (np.arange(steps.sum()) - firsts[owner]) / steps[owner]
+
+        owner = np.append(owner, len(seg) - 1)
+        t = np.append(t, 1.0)
+        return points[owner] + seg[owner] * t, owner, t
+
+    # -------------------------------------------------------------
+    # Index of kept strokes
+    # -------------------------------------------------------------
+    def _bbox(self, points, pad=0.0):
+        return (points.real.min() - pad, points.imag.min() - pad,
+                points.real.max() + pad, points.imag.max() + pad)
+
+    def _keep(self, points):
+        if len(points) < 2:
+            return
+        self.grid.insert(len(self.kept_a), self._bbox(points))
+        self.kept_a.append(points[:-1])
+        self.kept_b.append(points[1:])
+
+    def _nearby_segments(self, box):
+        ids = self.grid.query(box)
+        if not ids:
+            return np.empty(0, dtype=complex), np.empty(0, dtype=complex)
+
+        a = np.concatenate([self.kept_a[i] for i in ids])
+        b = np.concatenate([self.kept_b[i] for i in ids])
+
+        # Only segments whose own box meets the query box
+        x0, y0, x1, y1 = box
+        near = ((np.minimum(a.real, b.real) <= x1) & (np.maximum(a.real, b.real) >= x0) &
+                (np.minimum(a.imag, b.imag) <= y1) & (np.maximum(a.imag, b.imag) >= y0))
+        return a[near], b[near]
+
+    # -------------------------------------------------------------
+    # Main pass
+    # -------------------------------------------------------------
+    def _pieces(self, points, samples, owner, t, removed):
+        """The polyline with the removed samples cut out"""
+        pieces = []
+        kept = np.flatnonzero(~removed)
+        if len(kept) == 0:
+            return pieces
+
+        breaks = np.flatnonzero(np.diff(kept) > 1) + 1
+        for run in np.split(kept, breaks):
+            s0, s1 = run[0], run[-1]
+            if s0 == s1:
+                continue
+
+            inner = points[owner[s0] + 1:owner[s1] + 1]
+            if t[s1] == 0.0:
+                inner = inner[:-1]
+            pieces.append(np.concatenate(([samples[s0]], inner, [samples[s1]])))
+
+        return pieces
+
+    def remove(self):
+        """Return the strokes left after removing overlaps, in drawing order"""
+        result = []
+
+        for points in self.polylines:
+            if len(points) < 2:
+                result.append(points)
+                continue
+
+            samples, owner, t = self._samples(points)
+            a, b = self._nearby_segments(self._bbox(points, self.tolerance))
+            covered = _segment_distances(samples, a, b) <= self.tolerance
+
+            if covered.all():
+                self.paths_removed += 1
+                self.length_removed += float(np.abs(np.diff(points)).sum())
+                continue
+
+            # Covered runs long enough to count as overlap
+            distance = np.concatenate(([0.0], np.cumsum(np.abs(np.diff(samples)))))
+            edges = np.diff(np.concatenate(([0], covered.astype(np.int8), [0])))
+            run_starts = np.flatnonzero(edges == 1)
+            run_ends = np.flatnonzero(edges == -1) - 1
+
+            removed = np.zeros(len(samples), dtype=bool)
+            for s0, s1 in zip(run_starts, run_ends):
+                if distance[s1] - distance[s0] >= self.min_overlap:
+                    removed[s0:s1 + 1] = True
+                    self.length_removed += float(distance[s1] - distance[s0])
+
+            if not removed.any():
+                result.append(points)
+                self._keep(points)
+                continue
+
+            for piece in self._pieces(points, samples, owner, t, removed):
+                result.append(piece)
+                self._keep(piece)
+
+        return result
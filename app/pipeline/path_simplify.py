@@ -0,0 +1,95 @@
+# path_simplify.py
+import numpy as np
+
+# G-code coordinates are written with :.3f
+OUTPUT_DECIMALS = 3
+
+
+def drop_subresolution(points, starts, decimals=OUTPUT_DECIMALS):
+    """Mask of points that land on a new output coordinate.
+
+    A point is dropped when it rounds to the same written coordinate as the
+    point before it on the same path; the first point of each path is kept."""
+    rounded = np.round(points.real, decimals) + 1j * np.round(points.imag, decimals)
+    keep = np.ones(len(points), dtype=bool)
+    keep[1:] = rounded[1:] != rounded[:-1]
+    keep[starts] = True
+    return keep
+
+
+def rdp_mask(points, starts, ends, tolerance):
+    """Ramer-Douglas-Peucker over many polylines at once.
+
+    points is the concatenation of all polylines, starts/ends the index of
+    each one's first and last point. Every pass handles all open ranges in
+    one batch: the point farthest from its range's chord is kept and splits
+    the range, until no point is farther than tolerance."""
+    keep = np.zeros(len(points), dtype=bool)
+    keep[starts] = True
+    keep[ends] = True
+
+    starts = np.asarray(starts, dtype=np.int64)
+    ends = np.asarray(ends, dtype=np.int64)
+
+    while True:
+        interior = ends - starts - 1
+        open_ranges = interior > 0
+        starts, ends, interior = starts[open_ranges], ends[open_ranges], interior[open_ranges]
+        if len(starts) == 0:
+            break
+
+        # Indices of every interior point, grouped by range
+        firsts = np.concatenate(([0], np.cumsum(interior)[:-1]))
+        owner = np.repeat(np.arange(len(starts)), interior)
+        idx = starts[owner] + 1 + np.arange(interior.sum()) - firsts[owner]
+
+        a = points[starts][owner]
+        chord = points[ends][owner] - a
+        rel = points[idx] - a
+        length = np.abs(chord)
+
+        # Distance to the chord line, or to the start point of a closed range
+        with np.errstate(divide="ignore", invalid="ignore"):
+            dist = np.where(length > 0, np.abs((np.conj(chord) * rel).imag) / length, np.abs(rel))
+
+        # Farthest point of each range (first one on ties)
+        peak = np.maximum.reduceat(dist, firsts)
+        hits = np.flatnonzero(dist == peak[owner])
+        _, first_hit = np.unique(owner[hits], return_index=True)
+        split = idx[hits[first_hit]]
+
+        far = peak > tolerance
+        keep[split[far]] = True
+        starts, ends = (np.concatenate((starts[far], split[far])),
+                        np.concatenate((split[far], ends[far])))
+
+    return keep
+
+
+def simplify_polylines(polylines, tolerance, decimals=OUTPUT_DECIMALS):
+    """Drop sub-resolution points, then RDP-simplify every polyline.
+
+    Returns the simplified polylines (same order, same endpoints) and the
+    number of points removed."""
+    lengths = np.array([len(p) for p in polylines], dtype=np.int64)
+    if lengths.sum() == 0:
+        return polylines, 0
+
+    points = np.concatenate(polylines)
+    firsts = np.concatenate(([0], np.cumsum(lengths)[:-1]))[lengths > 0]
+    counts = np.zeros(len(polylines), dtype=np.int64)
+
+    keep = drop_subresolution(points, firsts, decimals)
+    counts[lengths > 0] = np.add.reduceat(keep.astype(np.int64), firsts)
+    points = points[keep]
+
+    offsets = np.concatenate(([0], np.cumsum(counts)))
+    starts = offsets[:-1][counts > 0]
+    ends = offsets[1:][counts > 0] - 1
+
+    keep = rdp_mask(points, starts, ends, tolerance)
+    counts[counts > 0] = np.add.reduceat(keep.astype(np.int64), starts)
+
+    simplified = np.split(points[keep], np.cumsum(counts)[:-1])
+    removed = int(lengths.sum() - counts.sum())
+    return simplified, removed
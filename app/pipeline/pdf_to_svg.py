@@ -2,10 +2,19 @@ import pymupdf
 import pathlib
 import re
 import os
-import xml.etree.ElementTree as ET
 from lxml import etree as LET
-from svgutils import transform as sg
 import copy
+import numpy as np
+from .svg_transforms import parse_transform, to_svg_matrix, matrix, extract_shapes
+from .colour_clustering import cluster_colours
+
+SVG_NS = "http://www.w3.org/2000/svg"
+XLINK_HREF = "{http://www.w3.org/1999/xlink}href"
+
+WHITE_VALUES = {"white", "#fff", "#ffffff"}
+
+# Elements whose geometry has to follow a page rotation
+DRAWABLE_TAGS = {"path", "rect", "circle", "ellipse", "line", "polyline", "polygon", "use", "image", "text"}
 
 class PdfToSvg:
     def __init__(self, pdf_file, svg_file, max_x, max_y):
@@ -14,7 +23,9 @@ class PdfToSvg:
         self.max_x = max_x
         self.max_y = max_y
         self.scale_factor = 1.0
-        self.colour_svgs = {}
+        self.colour_layers = {}
+        self.colour_map = {}
+        self.tree = None
 
     def convert(self):
         doc = pymupdf.open(self.pdf_file)
@@ -29,22 +40,11 @@ class PdfToSvg:
         if not svg_string.strip():
             raise ValueError("Generated SVG is empty")
 
-        temp_svg = pathlib.Path(self.svg_file)
-        temp_svg.write_text(svg_string, encoding="utf-8")
-
-        # Expand <use> tags
-        self.expand_svg_uses(temp_svg)
-
-        # Remove white shapes
-        self.remove_white_elements(temp_svg)
-
-        # Remove duplicate paths
-        self.remove_overlapping_paths(temp_svg)
+        # Parse once, every cleanup filter then works on this one tree
+        self.tree = self.parse_svg(svg_string)
+        self.clean_svg(self.tree.getroot())
 
-        # Remove Google Docs page rectangles
-        self.remove_page_rectangles(temp_svg)
-
-        return width, height, temp_svg
+        return width, height, pathlib.Path(self.svg_file)
 
     def rotate_pdf_page(self):
         doc = pymupdf.open(self.pdf_file)
@@ -57,179 +57,177 @@ class PdfToSvg:
 
         return temp_pdf
 
-    def get_layout(self, width, height):
-        return "portrait" if height >= width else "landscape"
-
-    def expand_svg_uses(self, svg_path):
-        ET.register_namespace("", "http://www.w3.org/2000/svg")
-        ET.register_namespace("xlink", "http://www.w3.org/1999/xlink")
-
-        tree = ET.parse(svg_path)
-        root = tree.getroot()
+    def rotate_svg(self, root, width, height):
+        """Rotate the rendered page 90 degrees clockwise without re-rendering it.
 
-        ns = {
-            "svg": "http://www.w3.org/2000/svg",
-            "xlink": "http://www.w3.org/1999/xlink"
-        }
+        Same result as pymupdf's set_rotation(90): the rotation is folded into
+        the transform of every drawable element and the page size is swapped."""
+        rotation = matrix(0.0, 1.0, -1.0, 0.0, height, 0.0)
 
-        defs = root.find("svg:defs", ns)
-        glyphs = {}
-        if defs is not None:
-            for elem in defs:
-                if elem.tag.endswith("path") and "id" in elem.attrib:
-                    glyphs[elem.attrib["id"]] = elem.attrib.get("d", "")
-
-        for use in root.findall(".//svg:use", ns):
-            href = use.attrib.get("{http://www.w3.org/1999/xlink}href")
-            if not href:
+        for elem in root.iter(LET.Element):
+            if LET.QName(elem).localname not in DRAWABLE_TAGS:
                 continue
 
-            glyph_id = href.replace("#", "")
-            if glyph_id not in glyphs:
+            parent = elem.getparent()
+            # Glyph definitions are placed by the <use>/path that references them
+            if parent is None or parent.tag.endswith("defs"):
                 continue
 
-            d = glyphs[glyph_id]
-            transform = use.attrib.get("transform", "")
-
-            new_path = ET.Element("{http://www.w3.org/2000/svg}path")
-            new_path.set("d", d)
-            if transform:
-                new_path.set("transform", transform)
-
-            parent = use.getparent() if hasattr(use, "getparent") else None
-            if parent is not None:
-                parent.append(new_path)
-            else:
-                root.append(new_path)
-
-        for use in root.findall(".//svg:use", ns):
-            parent = use.getparent() if hasattr(use, "getparent") else None
-            if parent is not None:
-                parent.remove(use)
-
-        tree.write(svg_path, encoding="utf-8", xml_declaration=True)
-
-    def remove_white_elements(self, svg_path):
-        parser = LET.XMLParser(remove_blank_text=True)
-        tree = LET.parse(str(svg_path), parser)
-        root = tree.getroot()
+            # Rotation has to happen outside any group transforms: G^-1 * R * G * M
+            group = np.identity(3)
+            for ancestor in elem.iterancestors():
+                group = parse_transform(ancestor.get("transform")) @ group
 
-        white_values = {"white", "#fff", "#ffffff"}
-
-        def is_white(elem):
-            fill = elem.get("fill", "").lower().strip()
-            if fill in white_values:
-                return True
-
-            style = elem.get("style", "").lower()
-            if "fill:" in style:
-                style_fill = style.split("fill:")[1].split(";")[0].strip()
-                if style_fill in white_values:
-                    return True
-
-            return False
-
-        for elem in root.xpath(".//*[@fill]"):
-            if elem.getparent().tag.endswith("defs"):
-                continue
-            if is_white(elem):
-                parent = elem.getparent()
-                if parent is not None:
-                    parent.remove(elem)
-
-        for elem in root.xpath(".//*[@style]"):
-            if elem.getparent().tag.endswith("defs"):
+            try:
+                local = np.linalg.inv(group) @ rotation @ group
+            except np.linalg.LinAlgError:
                 continue
-            if is_white(elem):
-                parent = elem.getparent()
-                if parent is not None:
-                    parent.remove(elem)
 
-        # Remove GoodNotes/Docs white background rectangles
-        for elem in root.xpath(".//path[@d]"):
-            if elem.getparent().tag.endswith("defs"):
-                continue
-            d = elem.get("d", "").replace(",", " ").strip()
-            if d.startswith("M0 0") and "H" in d and "V" in d and d.endswith("Z"):
-                parent = elem.getparent()
-                if parent is not None:
-                    parent.remove(elem)
+            elem.set("transform", to_svg_matrix(local @ parse_transform(elem.get("transform"))))
 
-        tree.write(str(svg_path), encoding="utf-8", xml_declaration=True, pretty_print=True)
+        root.set("width", f"{height:g}")
+        root.set("height", f"{width:g}")
+        root.set("viewBox", f"0 0 {height:g} {width:g}")
 
-    def remove_overlapping_paths(self, svg_path):
-        parser = LET.XMLParser(remove_blank_text=True)
-        tree = LET.parse(str(svg_path), parser)
-        root = tree.getroot()
+        return height, width
 
-        seen = set()
-        remove_list = []
+    def get_layout(self, width, height):
+        return "portrait" if height >= width else "landscape"
 
-        for elem in root.xpath(".//path[@d]"):
-            d = elem.get("d", "").strip()
-            key = d.replace(" ", "").replace(",", "")
+    def parse_svg(self, svg_string):
+        parser = LET.XMLParser(remove_blank_text=True)
+        return LET.ElementTree(LET.fromstring(svg_string.encode("utf-8"), parser))
 
-            if key in seen:
-                remove_list.append(elem)
-            else:
-                seen.add(key)
+    def save_svg(self, svg_path):
+        self.tree.write(str(svg_path), encoding="utf-8", xml_declaration=True, pretty_print=True)
 
-        for elem in remove_list:
-            parent = elem.getparent()
-            if parent is not None:
-                parent.remove(elem)
+    # -------------------------------------------------------------
+    # Cleanup filters, all applied in one traversal of the tree:
+    # expand <use> glyphs, drop white shapes, duplicate paths and
+    # Google Docs page rectangles (the giant M0 0 Hxxx Vyyy H0 Z)
+    # -------------------------------------------------------------
+    def clean_svg(self, root):
+        glyphs = {}
+        defs = root.find(f"{{{SVG_NS}}}defs")
+        if defs is not None:
+            for elem in defs:
+                if isinstance(elem.tag, str) and elem.tag.endswith("path") and "id" in elem.attrib:
+                    glyphs[elem.attrib["id"]] = elem.attrib.get("d", "")
 
-        if remove_list:
-            print(f"Removed {len(remove_list)} overlapping duplicate paths")
+        seen = set()
+        removed = {"white": 0, "duplicate": 0, "page_rect": 0}
 
-        tree.write(str(svg_path), encoding="utf-8", xml_declaration=True, pretty_print=True)
+        def visit(parent):
+            in_defs = parent.tag.endswith("defs")
 
-    # -------------------------------------------------------------
-    # Remove Google Docs page rectangles (the giant M0 0 Hxxx Vyyy H0 Z)
-    # -------------------------------------------------------------
-    def remove_page_rectangles(self, svg_path):
-        parser = LET.XMLParser(remove_blank_text=True)
-        tree = LET.parse(str(svg_path), parser)
-        root = tree.getroot()
+            for elem in list(parent):
+                # Skip comments and processing instructions
+                if not isinstance(elem.tag, str):
+                    continue
 
-        def is_page_rect(d):
-            if not d:
-                return False
-            d_clean = d.replace(" ", "").replace(",", "").upper()
-            return d_clean.startswith("M00H") and "V" in d_clean and d_clean.endswith("Z")
+                if elem.tag.endswith("use"):
+                    elem = self._expand_use(elem, glyphs)
+                    if elem is None:
+                        continue
 
-        remove_list = []
+                # Glyph definitions and clip paths directly inside <defs> are kept as-is
+                if in_defs:
+                    visit(elem)
+                    continue
 
-        for elem in root.xpath(".//svg:path", namespaces={"svg": "http://www.w3.org/2000/svg"}):
-            d = elem.get("d", "")
-            if is_page_rect(d):
-                # Skip the one inside <defs> (clipPath)
-                parent = elem.getparent()
-                if parent is not None and parent.tag.endswith("defs"):
+                if self._is_white(elem):
+                    parent.remove(elem)
+                    removed["white"] += 1
                     continue
-                remove_list.append(elem)
 
-        for elem in remove_list:
-            parent = elem.getparent()
-            if parent is not None:
-                parent.remove(elem)
+                if elem.tag.endswith("path"):
+                    d = elem.get("d", "")
+                    if self._is_page_rect(d):
+                        parent.remove(elem)
+                        removed["page_rect"] += 1
+                        continue
+
+                    key = (d.replace(" ", "").replace(",", ""), elem.get("transform", ""))
+                    if key in seen:
+                        parent.remove(elem)
+                        removed["duplicate"] += 1
+                        continue
+                    seen.add(key)
+
+                visit(elem)
+
+        visit(root)
+
+        if removed["white"]:
+            print(f"Removed {removed['white']} white elements")
+        if removed["duplicate"]:
+            print(f"Removed {removed['duplicate']} overlapping duplicate paths")
+        if removed["page_rect"]:
+            print(f"Removed {removed['page_rect']} Google Docs page rectangles")
+
+        return removed
+
+    def _expand_use(self, use, glyphs):
+        """Replace a <use> glyph reference with the path it points to, in place"""
+        parent = use.getparent()
+        href = use.get(XLINK_HREF) or use.get("href")
+        glyph_id = href.replace("#", "") if href else None
+
+        if glyph_id not in glyphs:
+            parent.remove(use)
+            return None
+
+        new_path = LET.Element(f"{{{SVG_NS}}}path")
+        new_path.set("d", glyphs[glyph_id])
+
+        # Keep placement and colour so the glyph lands in the right colour layer
+        for attr in ("transform", "fill", "stroke", "style"):
+            value = use.get(attr)
+            if value:
+                new_path.set(attr, value)
+
+        parent.replace(use, new_path)
+        return new_path
+
+    def _is_white(self, elem):
+        fill = elem.get("fill", "").lower().strip()
+        if fill in WHITE_VALUES:
+            return True
+
+        style = elem.get("style", "").lower()
+        if "fill:" in style:
+            style_fill = style.split("fill:")[1].split(";")[0].strip()
+            if style_fill in WHITE_VALUES:
+                return True
 
-        if remove_list:
-            print(f"Removed {len(remove_list)} Google Docs page rectangles")
+        return False
 
-        tree.write(str(svg_path), encoding="utf-8", xml_declaration=True, pretty_print=True)
+    def _is_page_rect(self, d):
+        if not d:
+            return False
+        d_clean = d.replace(" ", "").replace(",", "").upper()
+        return d_clean.startswith("M00H") and "V" in d_clean and d_clean.endswith("Z")
 
     # -------------------------------------------------------------
     # Split by colour, uncoloured → black
     # -------------------------------------------------------------
-    def split_by_colour(self, svg_path):
-        parser = LET.XMLParser(remove_blank_text=True)
-        tree = LET.parse(str(svg_path), parser)
-        root = tree.getroot()
+    def split_by_colour(self, svg_path, root=None, write_svg=False, max_colours=None, merge_delta_e=None):
+        """Split into colour layers: {colour_hex: shapes}, each a list of
+        extract_shapes records, taken from the in-memory tree when given.
+
+        Perceptually close colours (ΔE within merge_delta_e, then closest
+        first until at most max_colours remain) share one layer; the merge is
+        kept in self.colour_map as {original_hex: layer_hex}.
+
+        write_svg also writes each layer to {svg_path.stem}_{colour}.svg for
+        debugging; nothing downstream reads those files."""
+        if root is None:
+            parser = LET.XMLParser(remove_blank_text=True)
+            root = LET.parse(str(svg_path), parser).getroot()
 
         ns = {"svg": "http://www.w3.org/2000/svg"}
 
-        colour_groups = {}
+        coloured = []
         uncoloured_key = "000000"
 
         # Identify clipPath rectangle so we don't include it
@@ -291,11 +289,41 @@ class PdfToSvg:
             if not re.fullmatch(r"[0-9a-f]{6}", colour):
                 colour = uncoloured_key
 
-            if colour not in colour_groups:
-                colour_groups[colour] = []
-            colour_groups[colour].append(elem)
+            coloured.append((colour, elem))
+
+        # Merge close colours, weighted by how many elements use each
+        counts = {}
+        for colour, _ in coloured:
+            counts[colour] = counts.get(colour, 0) + 1
+        self.colour_map = cluster_colours(counts, max_colours, merge_delta_e)
+
+        colour_groups = {}
+        for colour, elem in coloured:
+            colour_groups.setdefault(self.colour_map[colour], []).append(elem)
+
+        # Shapes in defs are part of every layer, as they were in the per-colour files
+        defs = root.find("svg:defs", ns)
+        defs_shapes = extract_shapes([defs]) if defs is not None else []
+
+        layers = {}
+        for colour, elems in colour_groups.items():
+            layers[colour] = defs_shapes + extract_shapes(elems)
+
+        print("\nColour layers created:")
+        for c, shapes in layers.items():
+            merged = [f"#{m}" for m, rep in self.colour_map.items() if rep == c and m != c]
+            suffix = f" (merged {', '.join(merged)})" if merged else ""
+            print(f"  #{c} -> {len(shapes)} shapes{suffix}")
+
+        if write_svg:
+            self._write_layer_svgs(root, svg_path, colour_groups)
+
+        return layers
 
-        output = {}
+    def _write_layer_svgs(self, root, svg_path, colour_groups):
+        """Debug output: one standalone SVG per colour next to svg_path"""
+        ns = {"svg": "http://www.w3.org/2000/svg"}
+        svg_path = pathlib.Path(svg_path)
 
         for colour, elems in colour_groups.items():
             new_svg = LET.Element(root.tag, nsmap=root.nsmap)
@@ -318,23 +346,22 @@ class PdfToSvg:
                 pretty_print=True,
                 xml_declaration=True
             )
-            output[colour] = str(out_path)
-
-        print("\nColour layers created:")
-        for c in output:
-            print(f"  #{c} -> {output[c]}")
+            print(f"  #{colour} -> {out_path}")
 
-        return output
+    def render(self, rotate_mode="transform"):
+        """Render, clean and rotate the first page into self.tree; returns (width, height).
 
-
-
-
-    def run(self, split_colours=True):
-        width, height, temp_svg = self.convert()
+        rotate_mode="transform" rotates portrait pages geometrically on the
+        already-cleaned tree; "rerender" saves a rotated copy of the PDF and
+        renders it again."""
+        width, height, _ = self.convert()
         layout = self.get_layout(width, height)
 
         # Auto-rotate if portrait
-        if layout == "portrait":
+        if layout == "portrait" and rotate_mode == "transform":
+            width, height = self.rotate_svg(self.tree.getroot(), width, height)
+
+        elif layout == "portrait":
             temp_pdf = self.rotate_pdf_page()
             doc = pymupdf.open(temp_pdf)
             page = doc.load_page(0)
@@ -344,29 +371,66 @@ class PdfToSvg:
             doc.close()
 
             if svg_string.strip():
-                temp_svg.write_text(svg_string, encoding="utf-8")
-                self.expand_svg_uses(temp_svg)
-                self.remove_white_elements(temp_svg)
-                self.remove_overlapping_paths(temp_svg)
-                self.remove_page_rectangles(temp_svg)
+                self.tree = self.parse_svg(svg_string)
+                self.clean_svg(self.tree.getroot())
 
             try:
                 os.remove(temp_pdf)
             except:
                 pass
 
+        return width, height
+
+    def run(self, split_colours=True, write_svg=True, rotate_mode="transform", write_layer_svgs=False,
+            max_colours=None, merge_delta_e=None, stage_cache=None):
+        """Render, clean, rotate, scale and optionally split the first page.
+
+        Colour layers are returned in memory; with write_layer_svgs they are
+        also written out as SVG files; max_colours and merge_delta_e cap the
+        layers (see split_by_colour). With a stage_cache the rendered page and
+        its splits are reused across calls for the same upload."""
+        temp_svg = pathlib.Path(self.svg_file)
+
+        stage = stage_cache.get(self.pdf_file, rotate_mode) if stage_cache is not None else None
+        if stage is None:
+            width, height = self.render(rotate_mode)
+            # Kept before scaling, which depends on the printer
+            stage = {"width": width, "height": height, "svg": LET.tostring(self.tree), "splits": {}}
+            stage_changed = True
+        else:
+            width, height = stage["width"], stage["height"]
+            self.tree = self.parse_svg(stage["svg"].decode("utf-8"))
+            stage_changed = False
+
         # Auto-scale if exceeds bounds
-        scale = self._auto_scale(width, height, temp_svg)
+        scale = self._auto_scale(width, height, self.tree.getroot())
         self.scale_factor = scale
 
-        if split_colours:
-            self.colour_svgs = self.split_by_colour(temp_svg)
+        # Only serialization of the cleaned tree; skipped when nobody reads the file
+        if write_svg:
+            self.save_svg(temp_svg)
+
+        split_key = (max_colours, merge_delta_e)
+        if split_colours and split_key in stage["splits"] and not write_layer_svgs:
+            self.colour_layers, self.colour_map = stage["splits"][split_key]
+            print(f"\nColour layers reused: {len(self.colour_layers)}")
+
+        elif split_colours:
+            self.colour_layers = self.split_by_colour(temp_svg, self.tree.getroot(), write_svg=write_layer_svgs,
+                                                      max_colours=max_colours, merge_delta_e=merge_delta_e)
+            stage["splits"][split_key] = (self.colour_layers, self.colour_map)
+            stage_changed = True
+
         else:
-            self.colour_svgs = {}
+            self.colour_layers = {}
+            self.colour_map = {}
+
+        if stage_cache is not None and stage_changed:
+            stage_cache.put(self.pdf_file, rotate_mode, stage)
 
-        return width, height, temp_svg, self.colour_svgs
+        return width, height, temp_svg, self.colour_layers
 
-    def _auto_scale(self, width, height, temp_svg):
+    def _auto_scale(self, width, height, root):
         """Auto-scale SVG if it exceeds max dimensions"""
         if width <= self.max_x and height <= self.max_y:
             return 1.0
@@ -377,16 +441,7 @@ class PdfToSvg:
         scale = min(scale_x, scale_y)
         
         # Apply scaling to SVG
-        parser = LET.XMLParser(remove_blank_text=True)
-        tree = LET.parse(str(temp_svg), parser)
-        root = tree.getroot()
-        
-        if "viewBox" in root.attrib:
-            root.set("viewBox", root.attrib["viewBox"])
-        
         root.set("width", f"{width * scale}")
         root.set("height", f"{height * scale}")
         
-        tree.write(str(temp_svg), encoding="utf-8", xml_declaration=True, pretty_print=True)
-        
         return scale
@@ -0,0 +1,98 @@
+# stage_cache.py
+import hashlib
+import os
+import pickle
+import uuid
+
+# Bump when render/cleanup/rotate/split change what they produce
+STAGE_VERSION = 1
+
+# sha256 per (path, mtime, size), so an unchanged upload is hashed once per process
+_hashes = {}
+
+
+def file_sha256(path, chunk_size=1024 * 1024):
+    """Hex sha256 of a file's content; recomputed whenever the file changes"""
+    st = os.stat(path)
+    memo_key = (os.path.abspath(path), st.st_mtime_ns, st.st_size)
+    if memo_key not in _hashes:
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(chunk_size), b""):
+                digest.update(chunk)
+        _hashes[memo_key] = digest.hexdigest()
+    return _hashes[memo_key]
+
+
+def remember_sha256(path, digest):
+    """Record a hash computed elsewhere (e.g. while the file was uploaded)"""
+    st = os.stat(path)
+    _hashes[(os.path.abspath(path), st.st_mtime_ns, st.st_size)] = digest
+
+
+class StageCache:
+    """
+    The rendered, cleaned and rotated page of an upload, plus its colour
+    splits, kept on disk so /analyze/detect-colours and /convert (in any
+    worker process) do that work once per upload:
+    - keyed by the PDF's content hash and the rotation mode, so a changed
+      upload never sees an old stage
+    - one pickle per key: {"width", "height", "svg" (bytes, before scaling),
+      "splits": {(max_colours, merge_delta_e): (colour_layers, colour_map)}}
+    - least recently used stages are deleted once they exceed max_bytes
+    """
+
+    def __init__(self, cache_dir, max_bytes):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def _path(self, pdf_path, rotate_mode):
+        key = hashlib.sha256(f"{STAGE_VERSION}:{file_sha256(pdf_path)}:{rotate_mode}".encode()).hexdigest()
+        return os.path.join(self.cache_dir, f"{key}.pkl")
+
+    def get(self, pdf_path, rotate_mode):
+        """The stored stage dict, or None"""
+        path = self._path(pdf_path, rotate_mode)
+        try:
+            with open(path, "rb") as f:
+                stage = pickle.load(f)
+            os.utime(path)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            return None
+        return stage
+
+    def put(self, pdf_path, rotate_mode, stage):
+        path = self._path(pdf_path, rotate_mode)
+        tmp = f"{path}.tmp-{uuid.uuid4().hex[:8]}"
+        try:
+            with open(tmp, "wb") as f:
+                pickle.dump(stage, f, protocol=pickle.HIGHEST_PROTOCOL)
+            # Atomic, so readers in other processes see the old or the new stage
+            os.replace(tmp, path)
+        except OSError:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            return
+        self.evict()
+
+    def evict(self):
+        """Delete least recently used stages until they fit in max_bytes"""
+        entries = []
+        for entry in os.scandir(self.cache_dir):
+            if entry.name.endswith(".pkl"):
+                try:
+                    st = entry.stat()
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, entry.path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
@@ -1,233 +1,263 @@
 # svg_to_gcode.py
-from svgpathtools import svg2paths2, Path
-import xml.etree.ElementTree as ET
+from svgpathtools import parse_path
+from svgpathtools.svg_to_paths import ellipse2pathd, polyline2pathd, polygon2pathd, rect2pathd
+from lxml import etree as LET
 import numpy as np
-import re
+from .path_geometry import PathGeometry
+from .path_ordering import PathOrderer
+from .path_chaining import PathChainer
+from .path_simplify import simplify_polylines
+from .arc_fitting import ArcFitter
+from .path_overlap import OverlapRemover
+from .gcode_writer import write_lines
+from .gcode_compactor import compact
+from .gcode_program import GCodeProgram, initial_sequence, prime_sequence, end_sequence
+from .svg_transforms import SHAPE_TAGS, extract_shapes, scale, translate
+from app.models.conversion_options import ConversionOptions
 
 class SvgToGCode:
-    def __init__(self, svg_file, output_file, scale_factor=1.0, line_segments=50, retraction_height=50, plot_height=0.2, max_x=255, max_y=255, pen_offset_y=0):
+    def __init__(self, svg_file, output_file, scale_factor=1.0, retraction_height=50, plot_height=0.2, max_x=255, max_y=255, pen_offset_y=0,
+                 options=None, shapes=None):
         self.svg_file = svg_file
+        self.shapes = shapes
         self.output_file = output_file
         self.scale_factor = scale_factor
-        self.line_segments = line_segments
         self.retraction_height = retraction_height
         self.plot_height = plot_height
         self.max_x = max_x
         self.max_y = max_y
         self.pen_offset_y = pen_offset_y
+        self.options = options if options is not None else ConversionOptions()
+        self.stats = {}
 
-        # Load paths
-        self.paths, self.attributes, self.svg_attributes = svg2paths2(self.svg_file)
-        print("Loaded paths:", len(self.paths))
+        # Load paths and pack them into flat arrays; the svgpathtools objects are not kept
+        path_matrices = self.load_svg()
+        print("Loaded paths:", len(self.geometry))
 
-        # Apply SVG transforms
-        self.apply_svg_transforms()
+        # Apply SVG transforms, normalize to (0, 0) and scale in one pass
+        self.apply_svg_transforms(path_matrices)
+
+        # Thresholds below are in SVG units, geometry is already scaled
+        gap_threshold = self.options.gap_threshold * scale_factor
+        tiny_size = self.options.tiny_path_size * scale_factor
 
         # Remove duplicates
         self.dedupe_paths()
 
-        # Detect compound paths (multiple disconnected subpaths) and offer to split
-        compound_count = self._count_compound_paths(gap_threshold=1.0)
+        # Detect compound paths (multiple disconnected subpaths); split them if asked to
+        compound_count = self._count_compound_paths(gap_threshold=gap_threshold)
         if compound_count > 0:
-            ans = input(f"Found {compound_count} compound paths (multiple subpaths). Split them into separate paths? (y/n): ").strip().lower()
-            if ans == "y":
-                self.detect_and_split_compound_paths(gap_threshold=1.0)
+            if self.options.split_compound_paths:
+                self.detect_and_split_compound_paths(gap_threshold=gap_threshold)
+            else:
+                print(f"Found {compound_count} compound paths (multiple subpaths), left unsplit")
 
         # Drop any empty paths to avoid zero-length issues
-        self.paths = [p for p in self.paths if len(p) > 0]
-
-        # Normalize first
-        self.normalize_paths()
-        
-        # Filter out tiny paths (< 1mm)
-        self.filter_tiny_paths(min_size=1.0)
+        self.geometry = self.geometry.take(np.flatnonzero(self.geometry.stats.segments > 0))
 
-        # Scale actual geometry
-        self.scale_paths(scale_factor)
+        # Filter out tiny paths (< 1 SVG unit)
+        self.filter_tiny_paths(min_size=tiny_size)
 
         # Remove rectangle bounding box after all transformations but before sorting
-        self.remove_bounding_box_path()
+        if self.options.remove_bounding_box:
+            self.remove_bounding_box_path()
 
         # Sort paths to minimize printer head travel distance
         self.sort_paths()
 
-        self.gcode = []
-
-    def apply_svg_transforms(self):
-        tree = ET.parse(self.svg_file)
-        root = tree.getroot()
-
-        path_transforms = []
-
-        def get_group_transform(elem):
-            t = ""
-            parent = elem
-            while parent is not None:
-                tr = parent.get("transform")
-                if tr:
-                    t = tr + " " + t
-                parent = parent.getparent() if hasattr(parent, "getparent") else None
-            return t.strip()
-
-        for elem in root.iter():
-            if elem.tag.endswith("path"):
-                combined = get_group_transform(elem)
-                path_transforms.append(combined)
-
-        new_paths = []
-        for i, path in enumerate(self.paths):
-            transform_str = path_transforms[i] if i < len(path_transforms) else None
-
-            if transform_str and "matrix" in transform_str:
-                nums = re.findall(r"[-+]?\d*\.?\d+(?:[eE][-+]?\d+)?", transform_str)
-                if len(nums) == 6:
-                    a, b, c, d, e, f = map(float, nums)
-                    for seg in path:
-                        seg.start = complex(a*seg.start.real + c*seg.start.imag + e,
-                                            b*seg.start.real + d*seg.start.imag + f)
-                        seg.end = complex(a*seg.end.real + c*seg.end.imag + e,
-                                          b*seg.end.real + d*seg.end.imag + f)
-                        if hasattr(seg, "control1"):
-                            seg.control1 = complex(a*seg.control1.real + c*seg.control1.imag + e,
-                                                   b*seg.control1.real + d*seg.control1.imag + f)
-                        if hasattr(seg, "control2"):
-                            seg.control2 = complex(a*seg.control2.real + c*seg.control2.imag + e,
-                                                   b*seg.control2.real + d*seg.control2.imag + f)
-
-            new_paths.append(path)
-
-        self.paths = new_paths
-
-    def scale_paths(self, factor):
-        for path in self.paths:
-            for seg in path:
-                seg.start *= factor
-                seg.end *= factor
-                if hasattr(seg, "control1"):
-                    seg.control1 *= factor
-                if hasattr(seg, "control2"):
-                    seg.control2 *= factor
-
-    def normalize_paths(self):
-        xs = []
-        ys = []
-
-        for path in self.paths:
-            for seg in path:
-                xs.extend([seg.start.real, seg.end.real])
-                ys.extend([seg.start.imag, seg.end.imag])
-
-        if not xs or not ys:
-            return  # nothing to normalize
-
-        min_x = min(xs)
-        min_y = min(ys)
-
-        # Offset to start at (0, 0)
-        offset = complex(-min_x, -min_y)
-
-        for path in self.paths:
-            for seg in path:
-                seg.start += offset
-                seg.end += offset
-                if hasattr(seg, "control1"):
-                    seg.control1 += offset
-                if hasattr(seg, "control2"):
-                    seg.control2 += offset
+    def load_svg(self):
+        """Parse every shape in one walk of the SVG and compile its transform.
+
+        Shapes come from the in-memory layer when one was given (see
+        extract_shapes), otherwise from svg_file. Returns one 3x3 matrix per
+        loaded path: the element's own transform composed with all of its
+        ancestor groups."""
+        if self.shapes is None:
+            root = LET.parse(str(self.svg_file)).getroot()
+            self.svg_attributes = dict(root.attrib)
+            shapes = extract_shapes([root], SHAPE_TAGS)
+        else:
+            self.svg_attributes = {}
+            shapes = self.shapes
+
+        paths = []
+        matrices = []
+        self.attributes = []
+
+        for tag, attrib, m in shapes:
+            paths.append(parse_path(self._shape_to_d(tag, attrib)))
+            matrices.append(m)
+            self.attributes.append(attrib)
+
+        self.geometry = PathGeometry.from_paths(paths)
+        return np.array(matrices).reshape(-1, 3, 3)
+
+    def _shape_to_d(self, tag, attrib):
+        if tag == "path":
+            return attrib.get("d", "")
+        if tag == "polyline":
+            return polyline2pathd(attrib)
+        if tag == "polygon":
+            return polygon2pathd(attrib, True)
+        if tag == "line":
+            return f"M{attrib.get('x1', '0')} {attrib.get('y1', '0')}L{attrib.get('x2', '0')} {attrib.get('y2', '0')}"
+        if tag in ("ellipse", "circle"):
+            return ellipse2pathd(attrib)
+        return rect2pathd(attrib)
+
+    def apply_svg_transforms(self, path_matrices):
+        """Fold each path's SVG transform, the normalize offset and
+        scale_factor into one matrix, then apply it in a single array pass"""
+        bounds = self.geometry.transformed_bounds(path_matrices)
+        if bounds is None:
+            return  # nothing to transform
+
+        min_x, min_y, _, _ = bounds
+
+        # Offset to start at (0, 0), then scale actual geometry
+        placement = scale(self.scale_factor) @ translate(-min_x, -min_y)
+        self.geometry.apply_path_matrices(placement @ path_matrices)
 
     def filter_tiny_paths(self, min_size=1.0):
         """Remove paths smaller than min_size (in mm)"""
-        filtered = []
-        for path in self.paths:
-            xs = []
-            ys = []
-            for seg in path:
-                xs.extend([seg.start.real, seg.end.real])
-                ys.extend([seg.start.imag, seg.end.imag])
-            
-            if xs and ys:
-                width = max(xs) - min(xs)
-                height = max(ys) - min(ys)
-                size = max(width, height)
-                
-                if size >= min_size:
-                    filtered.append(path)
-        
-        if len(filtered) < len(self.paths):
-            print(f"Filtered out {len(self.paths) - len(filtered)} tiny paths (< {min_size}mm)")
-        
-        self.paths = filtered
+        bounds = self.geometry.path_bounds()
+        size = np.maximum(bounds[:, 2] - bounds[:, 0], bounds[:, 3] - bounds[:, 1])
+
+        # Empty paths have NaN bounds and are dropped as well
+        keep = np.flatnonzero(size >= min_size)
+
+        if len(keep) < len(self.geometry):
+            print(f"Filtered out {len(self.geometry) - len(keep)} tiny paths (< {min_size:g}mm)")
+
+        self.geometry = self.geometry.take(keep)
 
     def _count_compound_paths(self, gap_threshold=1.0):
         """Return number of paths that contain internal large gaps (i.e., compound paths)."""
-        count = 0
-        for path in self.paths:
-            for i in range(len(path) - 1):
-                end = path[i].end
-                nxt = path[i + 1].start
-                if abs(nxt - end) > gap_threshold:
-                    count += 1
-                    break
-        return count
+        gaps = self.geometry.gaps(gap_threshold)
+        return len(np.unique(self.geometry.path_index()[gaps]))
 
     def detect_and_split_compound_paths(self, gap_threshold=1.0):
         """Split paths that contain large internal gaps into separate paths.
 
         A gap is detected when the distance between a segment end and the next
         segment start exceeds `gap_threshold` (mm)."""
-        new_paths = []
-        split_total = 0
-        for path in self.paths:
-            current = []
-            for i, seg in enumerate(path):
-                current.append(seg)
-                is_last = (i == len(path) - 1)
-                if not is_last:
-                    nxt_start = path[i + 1].start
-                    if abs(nxt_start - seg.end) > gap_threshold:
-                        # boundary between subpaths
-                        new_paths.append(list(current))
-                        split_total += 1
-                        current = []
-            if current:
-                new_paths.append(list(current))
+        gaps = self.geometry.gaps(gap_threshold)
+        split_total = int(gaps.sum())
 
         if split_total > 0:
             print(f"Split {split_total} compound paths into separate subpaths.")
-            self.paths = new_paths
+            self.geometry.split_before(gaps)
+
+    # -------------------------------------------------------------
+    # G-code is produced lazily, block by block, so it can be written or
+    # streamed without ever holding the whole program in memory
+    # -------------------------------------------------------------
+    def header(self):
+        return (initial_sequence(self.plot_height, self.retraction_height) +
+                prime_sequence(self.plot_height, self.retraction_height, self.pen_offset_y))
+
+    def program(self):
+        """The G-code as a GCodeProgram: one block per stroke, produced on demand"""
+        return GCodeProgram(self.header(), self.iter_blocks(), end_sequence(), self.stats)
+
+    def iter_blocks(self):
+        fitter = ArcFitter(self.options.arc_tolerance) if self.options.arc_fitting else None
+        arc_counts = [0, 0]
+
+        travel_feed = self.options.travel_feedrate
+        draw_feed = self.options.draw_feedrate
+
+        # Overlaps are removed last, so "already drawn" follows the final drawing order
+        strokes = self.order_paths(self.simplify_paths(self.flatten_paths()))
+        for points in self.remove_overlaps(strokes):
+            xs = points.real
+            ys = points.imag + self.pen_offset_y
+
+            block = [f"G1 X{xs[0]:.3f} Y{ys[0]:.3f} F{travel_feed}",
+                     f"G1 Z{self.plot_height} ; pen down"]
+
+            if fitter is not None:
+                block.extend(self._iter_arc_moves(fitter, points, arc_counts))
+            else:
+                block.extend(f"G1 X{x:.3f} Y{y:.3f} F{draw_feed}" for x, y in zip(xs[1:], ys[1:]))
+
+            block.append(f"G1 Z{self.plot_height + self.retraction_height} ; pen up")
+            yield block
+
+        if fitter is not None:
+            arcs, replaced = arc_counts
+            self.stats["arc_moves"] = arcs
+            self.stats["arc_lines_replaced"] = replaced
+            print(f"Arc fitting ({self.options.arc_tolerance}mm): {replaced} G1 lines replaced by {arcs} arcs")
+
+    def _iter_arc_moves(self, fitter, points, arc_counts):
+        """G1/G2/G3 moves along one polyline; fitted runs become arcs, the rest stays G1"""
+        start = 0
+        for end, arc in fitter.fit(points):
+            x = points[end].real
+            y = points[end].imag + self.pen_offset_y
+
+            if arc is None:
+                yield f"G1 X{x:.3f} Y{y:.3f} F{self.options.draw_feedrate}"
+            else:
+                centre, ccw = arc
+                offset = centre - points[start]
+                yield f"{'G3' if ccw else 'G2'} X{x:.3f} Y{y:.3f} I{offset.real:.3f} J{offset.imag:.3f} F{self.options.draw_feedrate}"
+                arc_counts[0] += 1
+                arc_counts[1] += end - start
+
+            start = end
+
+    def iter_gcode(self):
+        lines = self.program().lines()
+        if self.options.compact_gcode:
+            lines = compact(lines, self.stats)
+        yield from lines
+
+    def order_paths(self, polylines):
+        """Drawing order (and direction) of the flattened paths"""
+        serpentine = [polylines[i] for i in self._serpentine_order() if len(polylines[i]) > 0]
+        strokes = self.chain_paths(serpentine)
+        if self.options.path_order == "serpentine":
+            return strokes
+
+        # The header leaves the pen at X0 Y0 in drawing coordinates
+        ordered = PathOrderer(strokes).order(start=0j, time_budget=self.options.path_order_time)
 
-    def add(self, line):
-        self.gcode.append(line)
+        # Measured on the same strokes, so pen lifts saved by chaining are not counted here
+        before = PathOrderer.travel(strokes)
+        after = PathOrderer.travel(ordered)
+        self.stats["travel_before_mm"] = before
+        self.stats["travel_after_mm"] = after
+        print(f"Pen-up travel: {before:.1f}mm -> {after:.1f}mm")
 
-    def add_header(self):
-        self.add("; ------------Initial Sequence------------")
-        self.add("G92 E0          ;Reset extruder")
-        self.add("M82             ;Absolute extrusion coordinates")
-        self.add("G90             ;Absolute position coordinates")
-        self.add(f"G1 Z{self.plot_height + self.retraction_height} ; pen up")
-        self.add(f"G1 X0 Y{self.pen_offset_y} Z{self.plot_height} ")
-        self.add(f"G1 X0.01 Y{self.pen_offset_y + 0.01} Z{self.plot_height} E0.001 F1200")
-        self.add(f"G1 X0 Y{self.pen_offset_y} Z{self.plot_height} F3000")
-        self.add("; ------------Initial Sequence------------")
-        self.add(f"G1 Z{self.plot_height + self.retraction_height} ; pen up")
+        return ordered
 
-    def add_footer(self):
-        self.add("; ------------End Sequence------------")
-        self.add("M84            ;Disable Motors")
-        self.add("; ------------End Sequence------------")
+    def chain_paths(self, polylines):
+        """Join paths that touch end-to-start into single strokes (no pen lift between them)"""
+        if not self.options.chain_tolerance:
+            return polylines
 
-    def _get_path_start(self, path):
-        return path[0].start if len(path) > 0 else complex(0, 0)
+        strokes = PathChainer(polylines, self.options.chain_tolerance).chain()
 
-    def convert_paths(self):
-        path_starts = [(i, self._get_centroid(path)) for i, path in enumerate(self.paths)]
+        saved = len(polylines) - len(strokes)
+        self.stats["pen_lifts_saved"] = saved
+        if saved:
+            print(f"Chained {len(polylines)} paths into {len(strokes)} strokes ({saved} pen lifts saved)")
 
-        # Filter out any paths that somehow produced a dummy centroid
-        path_starts = [(i, c) for i, c in path_starts if c is not None]
+        return strokes
+
+    def _serpentine_order(self):
+        """Centroids in 5mm Y bands, alternating left-to-right and right-to-left"""
+        centroids = self.geometry.path_centroids()
+        path_starts = [(i, centroids[i]) for i in range(len(centroids))]
+
+        # Filter out any paths that somehow produced a dummy centroid (no segments)
+        path_starts = [(i, c) for i, c in path_starts if not np.isnan(c)]
 
         path_starts.sort(key=lambda x: -x[1].imag)
 
-        y_threshold = 5
+        y_threshold = self.options.serpentine_band
         groups = []
         current_group = []
         last_y = None
@@ -253,159 +283,97 @@ class SvgToGCode:
                 group.sort(key=lambda x: -x[1].real)
             all_indices.extend([idx for idx, _ in group])
 
-        for path_idx in all_indices:
-            path = self.paths[path_idx]
-            if len(path) == 0:
-                continue
+        return all_indices
 
-            first = True
-            for segment in path:
-                for i, t in enumerate(np.linspace(0, 1, self.line_segments)):
-                    point = segment.point(t)
-                    x, y = point.real, point.imag + self.pen_offset_y
+    def flatten_paths(self):
+        """Sample every segment of every path in one vectorized batch"""
+        geometry = self.geometry
 
-                    if first and i == 0:
-                        self.add(f"G1 X{x:.3f} Y{y:.3f} F3000")
-                        self.add(f"G1 Z{self.plot_height} ; pen down")
-                        first = False
-                    else:
-                        self.add(f"G1 X{x:.3f} Y{y:.3f} F2000")
+        if not self.options.flatten_tolerance:
+            return geometry.flatten(self.options.line_segments)
 
-            self.add(f"G1 Z{self.plot_height + self.retraction_height} ; pen up")
+        # Adaptive: samples follow curvature, lines become a single move
+        samples = geometry.adaptive_samples(self.options.flatten_tolerance)
+        polylines = geometry.flatten(samples, skip_joints=True)
 
-    def sort_paths(self):
-        def centroid_tuple(path):
-            xs = []
-            ys = []
-            for seg in path:
-                xs.extend([seg.start.real, seg.end.real])
-                ys.extend([seg.start.imag, seg.end.imag])
-            if not xs or not ys:
-                return (0.0, 0.0)
-            cx = sum(xs) / len(xs)
-            cy = sum(ys) / len(ys)
-            return (cy, cx)
-
-        self.paths.sort(key=centroid_tuple)
-
-    def _get_centroid(self, path):
-        xs = []
-        ys = []
-        for seg in path:
-            xs.extend([seg.start.real, seg.end.real])
-            ys.extend([seg.start.imag, seg.end.imag])
-        if not xs or not ys:
-            return None  # signals "ignore" to caller
-        return complex(sum(xs) / len(xs), sum(ys) / len(ys))
+        fixed_points = geometry.n_segments * self.options.line_segments
+        adaptive_points = sum(len(p) for p in polylines)
+        self.stats["flatten_points_fixed"] = fixed_points
+        self.stats["flatten_points"] = adaptive_points
+        print(f"Adaptive flattening ({self.options.flatten_tolerance}mm): {fixed_points} -> {adaptive_points} points")
 
-    def dedupe_paths(self):
-        unique = []
-        seen = set()
+        return polylines
 
-        for p in self.paths:
-            key = tuple(
-                (round(seg.start.real, 4), round(seg.start.imag, 4),
-                 round(seg.end.real, 4), round(seg.end.imag, 4))
-                for seg in p
-            )
-            if key not in seen:
-                seen.add(key)
-                unique.append(p)
+    def remove_overlaps(self, polylines):
+        """Drop strokes, or stretches of strokes, that retrace earlier ones; takes them in drawing order"""
+        if not self.options.overlap_tolerance:
+            return polylines
 
-        self.paths = unique
+        remover = OverlapRemover(polylines, self.options.overlap_tolerance)
+        polylines = remover.remove()
+        self.stats["overlap_paths_removed"] = remover.paths_removed
+        self.stats["overlap_mm_removed"] = remover.length_removed
+        print(f"Removed overlapping strokes ({self.options.overlap_tolerance}mm): "
+              f"{remover.paths_removed} paths, {remover.length_removed:.1f}mm of line")
 
-    def save(self):
-        output = []
-        pen_up_count = 0
-        skipping = False
+        return polylines
+
+    def simplify_paths(self, polylines):
+        """RDP-simplify the flattened paths and drop points the output cannot resolve"""
+        if not self.options.simplify_tolerance:
+            return polylines
 
-        for line in self.gcode:
+        polylines, removed = simplify_polylines(polylines, self.options.simplify_tolerance)
+        self.stats["simplify_points_removed"] = removed
+        print(f"Simplified paths ({self.options.simplify_tolerance}mm): removed {removed} points")
 
-            # Count pen-ups
-            if "; pen up" in line:
-                pen_up_count += 1
+        return polylines
 
-                # After header (2 pen-ups), start skipping until next pen-up
-                if pen_up_count == 2:
-                    skipping = True
-                    output.append(line)  # keep the header's second pen-up
-                    continue
+    def sort_paths(self):
+        centroids = self.geometry.path_centroids()
+
+        # Stable sort on (y, x); paths without segments count as (0, 0)
+        centroids = np.where(np.isnan(centroids), 0, centroids)
+        order = np.lexsort((centroids.real, centroids.imag))
+        self.geometry = self.geometry.take(order)
 
-                # This is the first pen-up AFTER header → end skipping
-                if skipping and pen_up_count == 3:
-                    skipping = False
-                    # do NOT append this line (we delete rectangle including its pen-up)
-                    continue
+    def dedupe_paths(self):
+        unique = []
+        seen = set()
 
-            # Skip rectangle block
-            #if skipping:
-                #continue
+        for i, key in enumerate(self.geometry.path_keys(decimals=4)):
+            if key not in seen:
+                seen.add(key)
+                unique.append(i)
 
-            # Otherwise keep line
-            output.append(line)
+        self.geometry = self.geometry.take(unique)
 
+    def save(self):
         with open(self.output_file, "w") as f:
-            f.write("\n".join(output))
+            write_lines(self.iter_gcode(), f)
 
     def run(self):
-        self.add_header()
-        self.convert_paths()
-        self.add_footer()
         self.save()
 
     # -------------------------------------------------------------
     # NEW: remove bounding-box rectangle after transforms, before sorting
     # -------------------------------------------------------------
     def remove_bounding_box_path(self):
-        if not self.paths:
+        bounds = self.geometry.bounds()
+        if bounds is None:
             return
 
-        # Compute global bounds
-        all_x = []
-        all_y = []
-        for path in self.paths:
-            for seg in path:
-                all_x.extend([seg.start.real, seg.end.real])
-                all_y.extend([seg.start.imag, seg.end.imag])
-
-        if not all_x or not all_y:
-            return
+        global_min_x, global_min_y, global_max_x, global_max_y = bounds
+        path_bounds = self.geometry.path_bounds()
 
-        global_min_x = min(all_x)
-        global_min_y = min(all_y)
-        global_max_x = max(all_x)
-        global_max_y = max(all_y)
-
-        new_paths = []
-        removed = 0
-
-        for path in self.paths:
-            xs = []
-            ys = []
-            for seg in path:
-                xs.extend([seg.start.real, seg.end.real])
-                ys.extend([seg.start.imag, seg.end.imag])
-
-            if not xs or not ys:
-                new_paths.append(path)
-                continue
-
-            min_x = min(xs)
-            min_y = min(ys)
-            max_x = max(xs)
-            max_y = max(ys)
-
-            # Heuristic: rectangle bounding box covers full extents
-            if (abs(min_x - global_min_x) < 1e-3 and
-                abs(min_y - global_min_y) < 1e-3 and
-                abs(max_x - global_max_x) < 1e-3 and
-                abs(max_y - global_max_y) < 1e-3 and
-                len(path) == 4):
-                removed += 1
-                continue
-
-            new_paths.append(path)
+        # Heuristic: rectangle bounding box covers full extents
+        is_box = ((np.abs(path_bounds[:, 0] - global_min_x) < 1e-3) &
+                  (np.abs(path_bounds[:, 1] - global_min_y) < 1e-3) &
+                  (np.abs(path_bounds[:, 2] - global_max_x) < 1e-3) &
+                  (np.abs(path_bounds[:, 3] - global_max_y) < 1e-3) &
+                  (self.geometry.stats.segments == 4))
 
+        removed = int(is_box.sum())
         if removed:
             print(f"Removed {removed} bounding box path(s)")
-        self.paths = new_paths
+        self.geometry = self.geometry.take(np.flatnonzero(~is_box))
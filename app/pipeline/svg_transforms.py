@@ -0,0 +1,115 @@
+# svg_transforms.py
+import re
+import numpy as np
+
+TRANSFORM_RE = re.compile(r"(matrix|translate|scale|rotate|skewX|skewY)\s*\(([^)]*)\)")
+NUMBER_RE = re.compile(r"[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?")
+
+# SVG elements loaded as paths
+SHAPE_TAGS = {"path", "polyline", "polygon", "line", "ellipse", "circle", "rect"}
+
+
+def identity():
+    return np.identity(3)
+
+
+def matrix(a, b, c, d, e, f):
+    """3x3 affine matrix from the six SVG matrix(a,b,c,d,e,f) values"""
+    return np.array([[a, c, e],
+                     [b, d, f],
+                     [0.0, 0.0, 1.0]])
+
+
+def translate(tx, ty=0.0):
+    return matrix(1.0, 0.0, 0.0, 1.0, tx, ty)
+
+
+def scale(sx, sy=None):
+    return matrix(sx, 0.0, 0.0, sx if sy is None else sy, 0.0, 0.0)
+
+
+def rotate(angle, cx=0.0, cy=0.0):
+    """Rotation in degrees about (cx, cy), as in SVG rotate()"""
+    rad = np.radians(angle)
+    cos, sin = np.cos(rad), np.sin(rad)
+    m = matrix(cos, sin, -sin, cos, 0.0, 0.0)
+    if cx or cy:
+        m = translate(cx, cy) @ m @ translate(-cx, -cy)
+    return m
+
+
+def parse_transform(transform_str):
+    """Parse an SVG transform attribute into a single 3x3 matrix.
+
+    Supports matrix, translate, scale, rotate, skewX and skewY. Transforms in
+    a list are applied right to left, as the SVG spec requires."""
+    m = identity()
+    if not transform_str:
+        return m
+
+    for name, args in TRANSFORM_RE.findall(transform_str):
+        nums = [float(n) for n in NUMBER_RE.findall(args)]
+
+        if name == "matrix" and len(nums) == 6:
+            step = matrix(*nums)
+        elif name == "translate" and nums:
+            step = translate(*nums[:2])
+        elif name == "scale" and nums:
+            step = scale(*nums[:2])
+        elif name == "rotate" and nums:
+            step = rotate(*nums[:3])
+        elif name == "skewX" and nums:
+            step = matrix(1.0, 0.0, np.tan(np.radians(nums[0])), 1.0, 0.0, 0.0)
+        elif name == "skewY" and nums:
+            step = matrix(1.0, np.tan(np.radians(nums[0])), 0.0, 1.0, 0.0, 0.0)
+        else:
+            continue
+
+        m = m @ step
+
+    return m
+
+
+def to_svg_matrix(m):
+    """Format a 3x3 matrix as an SVG matrix(...) transform string"""
+    a, c, e = m[0]
+    b, d, f = m[1]
+    return "matrix({:.12g},{:.12g},{:.12g},{:.12g},{:.12g},{:.12g})".format(a, b, c, d, e, f)
+
+
+def _localname(tag):
+    return tag.rsplit("}", 1)[-1]
+
+
+def compile_transforms(root, tags):
+    """Walk the tree once and yield (element, matrix) for every element whose
+    tag is in `tags`, in document order.
+
+    The matrix is the element's full transform: its own transform composed
+    with every ancestor group's. Each group's matrix is computed once and
+    shared by all of its children."""
+    stack = [(root, parse_transform(root.get("transform")))]
+
+    while stack:
+        elem, m = stack.pop()
+
+        if _localname(elem.tag) in tags:
+            yield elem, m
+
+        children = [child for child in elem if isinstance(child.tag, str)]
+        for child in reversed(children):
+            transform_str = child.get("transform")
+            stack.append((child, m @ parse_transform(transform_str) if transform_str else m))
+
+
+def extract_shapes(elements, tags=SHAPE_TAGS):
+    """Plain (tag, attributes, matrix) records for every shape under the given
+    elements, each taken as a subtree root with no ancestors.
+
+    The records hold no lxml objects, so a layer can be handed to another
+    process or converted long after its tree is gone."""
+    shapes = []
+    for root in elements:
+        for elem, m in compile_transforms(root, tags):
+            shapes.append((_localname(elem.tag), dict(elem.attrib), m))
+    return shapes
@@ -0,0 +1,135 @@
+# tool_change_planner.py
+from itertools import permutations
+from .gcode_timing import estimate_time, START_STATE
+
+# Orders of up to this many items are searched exhaustively, longer ones greedily
+MAX_EXACT_ORDER = 7
+
+# Smaller gains (s) are rounding noise; the earlier order is kept
+MIN_GAIN = 1e-6
+
+
+def best_order(items, state, step, finish=None):
+    """Order of items with the lowest total time from state.
+
+    step(item, state) -> (seconds, state after the item); finish(state), if
+    given, is what follows the last item and is timed the same way. Returns
+    (order, seconds, end state)."""
+    items = list(items)
+    if len(items) <= MAX_EXACT_ORDER:
+        candidates = permutations(items)
+    else:
+        candidates = [_greedy_order(items, state, step)]
+
+    best = None
+    for order in candidates:
+        total, current = 0.0, state
+        for item in order:
+            seconds, current = step(item, current)
+            total += seconds
+            if best is not None and total >= best[1]:
+                break
+        else:
+            if finish is not None:
+                seconds, current = finish(current)
+                total += seconds
+            if best is None or total < best[1] - MIN_GAIN:
+                best = (list(order), total, current)
+
+    return best
+
+
+def _greedy_order(items, state, step):
+    """Always take the item that is cheapest from where the last one ended"""
+    remaining, order = list(items), []
+    while remaining:
+        costs = [step(item, state) for item in remaining]
+        k = min(range(len(remaining)), key=lambda i: costs[i][0])
+        order.append(remaining.pop(k))
+        state = costs[k][1]
+    return order
+
+
+class ToolChangePlanner:
+    """
+    Chooses the order of dock groups, and of the colour layers inside each
+    group, with the lowest estimated machine time.
+
+    Costs come from gcode_timing on the real sequences: a pickup or dropoff
+    is timed from wherever the head is, so the dock's X position counts, and
+    a layer (prime + strokes) is timed from the previous layer's last stroke.
+    Every prime leaves the head in the same place, so a layer's strokes take
+    the same time wherever it was entered from; they are timed once, by
+    whoever converted the layer.
+    """
+
+    def __init__(self, pickup, dropoff, prime, layers, header=()):
+        # pickup/dropoff: dock number -> lines
+        # layers: {colour: (seconds, end state)} of its strokes, timed from the end of the prime
+        self.pickup = pickup
+        self.dropoff = dropoff
+        self.prime = prime
+        self.layers = layers
+
+        self.header_time, self.start = estimate_time(header, START_STATE)
+        self._memo = {}
+
+    # -------------------------------------------------------------
+    # Timed units
+    # -------------------------------------------------------------
+    def _timed(self, key, lines, state):
+        memo_key = (key, state)
+        if memo_key not in self._memo:
+            self._memo[memo_key] = estimate_time(lines, state)
+        return self._memo[memo_key]
+
+    def _layer(self, colour, state):
+        prime_time, _ = self._timed("prime", self.prime, state)
+        body_time, state = self.layers[colour]
+        return prime_time + body_time, state
+
+    def _group(self, dock, colours, state):
+        """(seconds, layer order, end state) for one dock visit"""
+        memo_key = (("group", dock), state)
+        if memo_key not in self._memo:
+            pickup_time, state = self._timed(("pickup", dock), self.pickup(dock), state)
+
+            # The last layer decides how far it is back to the dock
+            dropoff = lambda state: self._timed(("dropoff", dock), self.dropoff(dock), state)
+            order, layer_time, state = best_order(colours, state, self._layer, dropoff)
+            self._memo[memo_key] = (pickup_time + layer_time, order, state)
+        return self._memo[memo_key]
+
+    # -------------------------------------------------------------
+    # Planning
+    # -------------------------------------------------------------
+    def estimate(self, dock_groups):
+        """Estimated seconds for the dock groups exactly in the order given"""
+        total, state = self.header_time, self.start
+        for dock, colours in dock_groups:
+            seconds, state = self._timed(("pickup", dock), self.pickup(dock), state)
+            total += seconds
+            for c in colours:
+                seconds, state = self._layer(c, state)
+                total += seconds
+            seconds, state = self._timed(("dropoff", dock), self.dropoff(dock), state)
+            total += seconds
+        return total
+
+    def plan(self, dock_groups):
+        """[(dock, [colours])] in the fastest order found, and its estimated seconds"""
+        groups = dict(dock_groups)
+
+        def visit(dock, state):
+            seconds, _, state = self._group(dock, groups[dock], state)
+            return seconds, state
+
+        # Layer orders only depend on the dock and where the head came from
+        docks, seconds, _ = best_order(groups, self.start, visit)
+
+        plan, state = [], self.start
+        for dock in docks:
+            _, order, state = self._group(dock, groups[dock], state)
+            plan.append((dock, order))
+
+        return plan, self.header_time + seconds
@@ -1,13 +1,22 @@
 from app.pipeline.pdf_to_svg import PdfToSvg
 from app.pipeline.svg_to_gcode import SvgToGCode
 from app.pipeline.multi_colour_manager import MultiColourManager
+from app.pipeline.gcode_writer import iter_chunks, iter_file, write_lines
 from app.models.convert_req import ConvertRequest
-from app.config import PRINTERS, PEN_OFFSET_FWD, RETRACT_HEIGHT, PLOT_HEIGHT
+from app.models.conversion_options import ConversionOptions
+from app.pipeline.stage_cache import StageCache, remember_sha256
+from app.services.result_cache import ResultCache, ARTIFACT_KEYS
+from app.services.job_registry import JobRegistry
+from app.config import (PRINTERS, PEN_OFFSET_FWD, RETRACT_HEIGHT, PLOT_HEIGHT, COLOUR_WORKERS, WRITE_LAYER_SVGS,
+                        RESULT_CACHE_BYTES, STAGE_CACHE_DIR, STAGE_CACHE_BYTES, JOB_DB_PATH)
 import os
 import uuid
 
 class ConversionService:
-    def __init__(self):
+    def __init__(self, colour_workers=COLOUR_WORKERS):
+        # Processes converting the colour layers of one multi-colour job
+        self.colour_workers = colour_workers
+
         self.storage_dir = "storage"
         self.svgs_dir = os.path.join(self.storage_dir, "svgs")
         self.gcode_dir = os.path.join(self.storage_dir, "gcode")
@@ -16,28 +25,91 @@ class ConversionService:
         os.makedirs(self.svgs_dir, exist_ok=True)
         os.makedirs(self.gcode_dir, exist_ok=True)
 
-    def convert(self, pdf_path: str, request: ConvertRequest):
+        self.cache = ResultCache(os.path.join(self.storage_dir, "cache", "results"), RESULT_CACHE_BYTES)
+        self.stages = StageCache(STAGE_CACHE_DIR, STAGE_CACHE_BYTES)
+        self.registry = JobRegistry(JOB_DB_PATH)
+
+    def _cache_key(self, pdf_path: str, request: ConvertRequest):
+        """Everything that decides the output: PDF content, request and machine constants"""
+        return self.cache.key(pdf_path, {
+            "request": request.model_dump(mode="json"),
+            "printer": PRINTERS[request.printer],
+            "retract_height": RETRACT_HEIGHT,
+            "plot_height": PLOT_HEIGHT,
+            "pen_offset_fwd": PEN_OFFSET_FWD
+        })
+
+    def cached(self, pdf_path: str, request: ConvertRequest, job_id: str = None, sha256: str = None):
+        """Result of an identical earlier conversion, its files linked under
+        job_id (a new one unless given), or None.
+
+        sha256 is the PDF's hash when already known (e.g. from the job
+        registry), so the file is not read again to key the caches."""
+        if sha256 is not None:
+            remember_sha256(pdf_path, sha256)
+        if job_id is None:
+            job_id = str(uuid.uuid4())[:8]
+        result = self.cache.get(self._cache_key(pdf_path, request), job_id)
+        if result is not None:
+            result["cached"] = True
+            self._record(request, result)
+        return result
+
+    def _record(self, request: ConvertRequest, result: dict):
+        """List the result's files under its job in the registry, e.g. multi_gcode"""
+        self.registry.add_artifacts(result["job_id"], {
+            f"{request.mode}_{name}": result[name] for name in ARTIFACT_KEYS if result.get(name)
+        })
+
+    def _store(self, pdf_path: str, request: ConvertRequest, result: dict, program):
+        # Layers that failed may succeed next time, so partial results are not kept;
+        # empty layers stay empty
+        if set(result.get("errors", ())) <= getattr(program, "empty", set()):
+            self.cache.put(self._cache_key(pdf_path, request), result)
+
+    def _build(self, pdf_path: str, request: ConvertRequest, job_id: str = None):
+        """Render the PDF and set up the G-code program for this request.
+
+        Returns the job id (a new one unless given), the program (SvgToGCode
+        or MultiColourManager) and the result entries describing it. No G-code
+        has been generated yet."""
 
         printer = request.printer
         mode = request.mode
-        line_segments = request.line_segments
         dock_positions = request.dock_positions
 
+        # Conversion knobs only; the converter never prompts for anything
+        options = ConversionOptions(**request.model_dump(include=set(ConversionOptions.model_fields)))
+
         printer_config = PRINTERS[printer]
 
         max_x = printer_config["max_x"]
         max_y = printer_config["max_y"] - PEN_OFFSET_FWD
 
         # Generate unique ID for this job
-        job_id = str(uuid.uuid4())[:8]
+        if job_id is None:
+            job_id = str(uuid.uuid4())[:8]
         
         svg_path = os.path.join(self.svgs_dir, f"{job_id}_drawing.svg")
         gcode_path = os.path.join(self.gcode_dir, f"{job_id}_output.gcode")
+        multi_gcode_path = os.path.join(self.gcode_dir, f"{job_id}_multicolour.gcode")
+
+        # An earlier conversion of this job may have left hard links into the
+        # result cache here; replace those files instead of writing into them
+        for path in ((svg_path, gcode_path) if mode == "single" else (multi_gcode_path,)):
+            if os.path.exists(path):
+                os.remove(path)
 
         pdf_to_svg = PdfToSvg(pdf_path, svg_path, max_x, max_y)
 
-        width, height, temp_svg, colour_svgs = pdf_to_svg.run(
-            split_colours=(mode == "multi")
+        # Multi-colour only needs the per-colour layers, not the combined SVG
+        width, height, temp_svg, colour_layers = pdf_to_svg.run(
+            split_colours=(mode == "multi"),
+            write_svg=(mode == "single"),
+            write_layer_svgs=WRITE_LAYER_SVGS,
+            max_colours=request.max_colours,
+            merge_delta_e=request.colour_merge_delta_e,
+            stage_cache=self.stages
         )
 
         if mode == "single":
@@ -45,42 +117,85 @@ class ConversionService:
                 svg_file=svg_path,
                 output_file=gcode_path,
                 scale_factor=pdf_to_svg.scale_factor,
-                line_segments=line_segments,
                 retraction_height=RETRACT_HEIGHT,
                 plot_height=PLOT_HEIGHT,
                 max_x=max_x,
                 max_y=max_y,
-                pen_offset_y=PEN_OFFSET_FWD
+                pen_offset_y=PEN_OFFSET_FWD,
+                options=options
             )
 
-            svg_to_gcode.run()
-
-            return {
+            return job_id, svg_to_gcode, {
                 "job_id": job_id,
                 "svg": svg_path,
                 "gcode": gcode_path
             }
 
         else:
-            multi_gcode_path = os.path.join(self.gcode_dir, f"{job_id}_multicolour.gcode")
-            
             manager = MultiColourManager(
-                colour_svgs=colour_svgs,
+                colour_layers=colour_layers,
                 output_file=multi_gcode_path,
                 scale_factor=pdf_to_svg.scale_factor,
-                line_segments=line_segments,
                 retraction_height=RETRACT_HEIGHT,
                 plot_height=PLOT_HEIGHT,
                 max_x=max_x,
                 max_y=max_y,
                 pen_offset_y=PEN_OFFSET_FWD,
-                dock_positions=dock_positions
+                dock_positions=dock_positions,
+                options=options,
+                workers=self.colour_workers
             )
 
-            manager.assemble()
-
-            return {
+            return job_id, manager, {
                 "job_id": job_id,
                 "gcode": multi_gcode_path,
-                "colours": list(colour_svgs.keys())
-            }
\ No newline at end of file
+                "colours": list(colour_layers.keys()),
+                "colour_map": pdf_to_svg.colour_map
+            }
+
+    def convert(self, pdf_path: str, request: ConvertRequest, job_id: str = None, sha256: str = None):
+        cached = self.cached(pdf_path, request, job_id, sha256)
+        if cached is not None:
+            return cached
+
+        job_id, program, result = self._build(pdf_path, request, job_id)
+
+        # Written to disk in chunks as it is generated
+        with open(result["gcode"], "w") as f:
+            write_lines(program.iter_gcode(), f)
+
+        result["stats"] = program.stats
+        if getattr(program, "errors", None):
+            result["errors"] = program.errors
+
+        self._store(pdf_path, request, result, program)
+        self._record(request, result)
+        result["cached"] = False
+        return result
+
+    def stream(self, pdf_path: str, request: ConvertRequest, job_id: str = None, sha256: str = None):
+        """Convert and return (job_id, chunk iterator) for an HTTP download.
+
+        The PDF is rendered up front, so bad input fails before the response
+        starts; G-code is then generated while the client reads it. Cached
+        results are streamed from disk, and a download that runs to the end
+        is cached in turn."""
+        cached = self.cached(pdf_path, request, job_id, sha256)
+        if cached is not None:
+            return cached["job_id"], iter_file(cached["gcode"])
+
+        job_id, program, result = self._build(pdf_path, request, job_id)
+        return job_id, self._tee(pdf_path, request, program, result)
+
+    def _tee(self, pdf_path, request, program, result):
+        """Yield the G-code chunks while also writing them to the job's file"""
+        with open(result["gcode"], "w") as f:
+            for chunk in iter_chunks(program.iter_gcode()):
+                f.write(chunk)
+                yield chunk
+
+        result["stats"] = program.stats
+        if getattr(program, "errors", None):
+            result["errors"] = program.errors
+        self._store(pdf_path, request, result, program)
+        self._record(request, result)
@@ -0,0 +1,163 @@
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from collections import OrderedDict
+import os
+import threading
+import uuid
+
+from app.models.convert_req import ConvertRequest
+from app.services.conversion_service import ConversionService
+from app.config import JOB_HISTORY
+
+
+# The conversion service of a pool worker, set up once by start_worker
+_worker_service = None
+
+
+def start_worker():
+    """Pool initializer: one service per worker process, reused by all its jobs.
+
+    The pool already runs a conversion per worker, so colour layers are
+    converted one after another rather than in a pool of their own."""
+    global _worker_service
+    _worker_service = ConversionService(colour_workers=1)
+
+
+def run_conversion(pdf_path: str, request: ConvertRequest, job_id: str, sha256: str = None):
+    """Worker process entry point: one full conversion, returning its result dict"""
+    return _worker_service.convert(pdf_path, request, job_id=job_id, sha256=sha256)
+
+
+class JobManager:
+    """
+    Runs conversions in a bounded process pool so request handlers return at once:
+    - submit() queues a conversion and returns its job id; results already
+      in the service's cache are answered without touching the pool
+    - status() reports queued / running / done / failed / cancelled, with
+      the result or error once finished
+    - cancel() drops a queued job; a running one cannot be interrupted, so it
+      is marked cancelled and its output is deleted when it finishes
+    """
+
+    def __init__(self, service: ConversionService, workers=None, history=JOB_HISTORY):
+        self.service = service
+        self.workers = workers if workers is not None else (os.cpu_count() or 1)
+        self.history = history
+        self.pool = None
+        self.jobs = OrderedDict()
+        self.lock = threading.Lock()
+
+    def _pool(self):
+        # Started on first use, and again if a worker died and broke it
+        if self.pool is None:
+            self.pool = ProcessPoolExecutor(max_workers=self.workers, initializer=start_worker)
+        return self.pool
+
+    def submit(self, pdf_path: str, request: ConvertRequest, job_id: str = None, sha256: str = None) -> str:
+        """Queue a conversion under job_id (a new one unless given); sha256 is
+        the PDF's hash when already known.
+
+        Raises ValueError while an earlier conversion of the same job is still
+        queued or running, as both would write the same files. Looking up the
+        result cache reads files, so call this from a worker thread, not the
+        event loop."""
+        if job_id is None:
+            job_id = str(uuid.uuid4())[:8]
+
+        with self.lock:
+            self._check_idle(job_id)
+
+        # Repeats of a finished conversion are done as soon as they are asked for
+        result = self.service.cached(pdf_path, request, job_id, sha256)
+        if result is not None:
+            future = Future()
+            future.set_result(result)
+            with self.lock:
+                self._check_idle(job_id)
+                self.jobs.pop(job_id, None)
+                self.jobs[job_id] = {"future": future, "cancelled": False}
+                self._forget_finished()
+            return job_id
+
+        with self.lock:
+            # Checked again: another thread may have queued the job meanwhile
+            self._check_idle(job_id)
+            try:
+                future = self._pool().submit(run_conversion, pdf_path, request, job_id, sha256)
+            except BrokenProcessPool:
+                self.pool = None
+                future = self._pool().submit(run_conversion, pdf_path, request, job_id, sha256)
+
+            self.jobs.pop(job_id, None)
+            self.jobs[job_id] = {"future": future, "cancelled": False}
+            self._forget_finished()
+
+        future.add_done_callback(lambda f, job_id=job_id: self._finished(job_id, f))
+        return job_id
+
+    def _check_idle(self, job_id):
+        current = self.jobs.get(job_id)
+        if current is not None and not current["future"].done():
+            raise ValueError(f"Job {job_id} is already being converted")
+
+    def _finished(self, job_id, future):
+        """Clean up after a job that was cancelled while it ran"""
+        job = self.jobs.get(job_id)
+        if job is None or job["future"] is not future:
+            return
+        if not job["cancelled"] or future.cancelled() or future.exception() is not None:
+            return
+
+        for key in ("gcode", "svg"):
+            path = future.result().get(key)
+            if path and os.path.exists(path):
+                os.remove(path)
+
+    def _forget_finished(self):
+        finished = [job_id for job_id, job in self.jobs.items() if job["future"].done()]
+        for job_id in finished[:max(0, len(finished) - self.history)]:
+            del self.jobs[job_id]
+
+    def status(self, job_id: str):
+        """Status dict for the job, or None if it is unknown"""
+        job = self.jobs.get(job_id)
+        if job is None:
+            return None
+
+        future = job["future"]
+        status = {"job_id": job_id}
+
+        if job["cancelled"] or future.cancelled():
+            status["status"] = "cancelled"
+        elif not future.done():
+            status["status"] = "running" if future.running() else "queued"
+        elif future.exception() is not None:
+            status["status"] = "failed"
+            status["error"] = str(future.exception())
+        else:
+            status["status"] = "done"
+            status["result"] = future.result()
+
+        return status
+
+    def cancel(self, job_id: str):
+        """Cancel the job; returns its new status, or None if it is unknown"""
+        job = self.jobs.get(job_id)
+        if job is None:
+            return None
+
+        future = job["future"]
+        if not future.done():
+            if not future.cancel():
+                # Already running: let it finish, then throw the output away
+                job["cancelled"] = True
+                if future.done():
+                    self._finished(job_id, future)
+
+        return self.status(job_id)
+
+    def shutdown(self):
+        if self.pool is not None:
+            self.pool.shutdown(wait=False, cancel_futures=True)
+            self.pool = None
+
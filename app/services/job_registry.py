@@ -0,0 +1,120 @@
+import json
+import os
+import sqlite3
+import time
+from contextlib import closing
+
+from app.pipeline.analyzer import PDFAnalyzer
+from app.pipeline.stage_cache import file_sha256
+
+# Columns holding JSON documents
+JSON_COLUMNS = ("fits", "colours", "artifacts")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id      TEXT PRIMARY KEY,
+    upload_path TEXT NOT NULL,
+    sha256      TEXT NOT NULL,
+    page_count  INTEGER NOT NULL,
+    width       REAL NOT NULL,
+    height      REAL NOT NULL,
+    layout      TEXT NOT NULL,
+    fits        TEXT NOT NULL,
+    colours     TEXT NOT NULL DEFAULT '{}',
+    artifacts   TEXT NOT NULL DEFAULT '{}',
+    created_at  REAL NOT NULL
+)
+"""
+
+
+def colour_key(max_colours=None, merge_delta_e=None):
+    """Key of a colour detection in the colours column, per merge setting"""
+    return f"{max_colours}:{merge_delta_e}"
+
+
+class JobRegistry:
+    """
+    Uploads and what is known about them, in SQLite keyed by the upload's job id:
+    - page count, size, layout and fit checks for every printer (upright and
+      rotated), all worked out once when the PDF is registered
+    - detected colours per colour-merge setting
+    - artifacts produced by conversions of the job
+    Every call opens its own connection, so API handlers and conversion
+    worker processes can share the database file.
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        with closing(self._connect()) as db:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute(SCHEMA)
+
+    def _connect(self):
+        db = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        db.row_factory = sqlite3.Row
+        return db
+
+    # -------------------------------------------------------------
+    # Jobs
+    # -------------------------------------------------------------
+    def register(self, job_id, upload_path, sha256=None):
+        """Read the PDF's metadata once and store the job; returns its record"""
+        metadata = PDFAnalyzer.get_metadata(upload_path)
+        if sha256 is None:
+            sha256 = file_sha256(upload_path)
+
+        with closing(self._connect()) as db:
+            db.execute(
+                "INSERT OR REPLACE INTO jobs (job_id, upload_path, sha256, page_count, width, height, layout, fits, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (job_id, upload_path, sha256, metadata["page_count"], metadata["width"], metadata["height"],
+                 metadata["layout"], json.dumps(metadata["fits"]), time.time())
+            )
+        return self.get(job_id)
+
+    def get(self, job_id):
+        """The job's record as a dict, or None if it is unknown"""
+        with closing(self._connect()) as db:
+            row = db.execute("SELECT * FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+
+        record = dict(row)
+        for column in JSON_COLUMNS:
+            record[column] = json.loads(record[column])
+        record["needs_rotation"] = record["layout"] == "portrait"
+        return record
+
+    def resolve(self, job_id, upload_path=None):
+        """The job's record; a job from before the registry is registered from
+        its upload_path. None if neither is available."""
+        record = self.get(job_id)
+        if record is None and upload_path and os.path.exists(upload_path):
+            record = self.register(job_id, upload_path)
+        return record
+
+    # -------------------------------------------------------------
+    # Results attached to a job
+    # -------------------------------------------------------------
+    def _merge(self, job_id, column, updates):
+        with closing(self._connect()) as db:
+            # Read-modify-write under one write lock
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                row = db.execute(f"SELECT {column} FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+                if row is not None:
+                    value = json.loads(row[0])
+                    value.update(updates)
+                    db.execute(f"UPDATE jobs SET {column} = ? WHERE job_id = ?", (json.dumps(value), job_id))
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+
+    def set_colours(self, job_id, key, detection):
+        self._merge(job_id, "colours", {key: detection})
+
+    def add_artifacts(self, job_id, artifacts):
+        """Record produced files, e.g. {"gcode": path}; unknown job ids are ignored"""
+        self._merge(job_id, "artifacts", artifacts)
@@ -0,0 +1,157 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+import uuid
+
+from app.pipeline.stage_cache import file_sha256
+
+# Bump when the pipeline changes what it writes for the same input
+CACHE_VERSION = 1
+
+# Result entries that name files written by the conversion
+ARTIFACT_KEYS = ("gcode", "svg")
+
+
+def _link_or_copy(src, dst):
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copyfile(src, dst)
+
+
+class ResultCache:
+    """
+    Finished conversions on disk, keyed by the PDF's content hash plus every
+    setting that shapes the output:
+    - each entry is a directory holding result.json and its artifacts
+      (hard-linked where possible, so a cached G-code file costs nothing extra)
+    - a hit links the artifacts back under the new job id and returns the
+      stored result
+    - entries are evicted least recently used first once their total size
+      exceeds max_bytes; result.json's mtime marks the last use
+    - entries are written to a temporary directory and renamed into place,
+      so several worker processes can share one cache directory
+    """
+
+    def __init__(self, cache_dir, max_bytes):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    # -------------------------------------------------------------
+    # Keys
+    # -------------------------------------------------------------
+    def key(self, pdf_path: str, settings: dict) -> str:
+        """Hash of the PDF content and the settings; settings must be JSON-serializable"""
+        payload = json.dumps({"version": CACHE_VERSION, "settings": settings}, sort_keys=True)
+        digest = hashlib.sha256(file_sha256(pdf_path).encode())
+        digest.update(payload.encode())
+        return digest.hexdigest()
+
+    def _entry(self, key):
+        return os.path.join(self.cache_dir, key)
+
+    # -------------------------------------------------------------
+    # Lookup and store
+    # -------------------------------------------------------------
+    def get(self, key: str, job_id: str):
+        """The cached result with its artifacts copied under job_id, or None"""
+        entry = self._entry(key)
+        try:
+            with open(os.path.join(entry, "result.json")) as f:
+                stored = json.load(f)
+
+            result = dict(stored["result"], job_id=job_id)
+            for name, path in stored["artifacts"].items():
+                target = self._rename(result[name], stored["result"]["job_id"], job_id)
+                # Never write into an existing file, it may be linked to another entry
+                if os.path.exists(target):
+                    os.remove(target)
+                _link_or_copy(os.path.join(entry, path), target)
+                result[name] = target
+
+            os.utime(os.path.join(entry, "result.json"))
+        except (OSError, ValueError, KeyError):
+            # Missing, half-evicted or unreadable entries are plain misses
+            with self.lock:
+                self.misses += 1
+            return None
+
+        with self.lock:
+            self.hits += 1
+        return result
+
+    @staticmethod
+    def _rename(path, old_job_id, new_job_id):
+        directory, name = os.path.split(path)
+        return os.path.join(directory, name.replace(old_job_id, new_job_id, 1))
+
+    def put(self, key: str, result: dict):
+        """Store a finished result whose artifacts exist on disk"""
+        entry = self._entry(key)
+        if os.path.exists(entry):
+            return
+
+        tmp = f"{entry}.tmp-{uuid.uuid4().hex[:8]}"
+        os.makedirs(tmp)
+        try:
+            artifacts = {}
+            for name in ARTIFACT_KEYS:
+                path = result.get(name)
+                if path and os.path.exists(path):
+                    artifacts[name] = f"{name}{os.path.splitext(path)[1]}"
+                    _link_or_copy(path, os.path.join(tmp, artifacts[name]))
+
+            with open(os.path.join(tmp, "result.json"), "w") as f:
+                json.dump({"result": result, "artifacts": artifacts}, f)
+
+            os.rename(tmp, entry)
+        except OSError:
+            # Another process stored the same key first
+            shutil.rmtree(tmp, ignore_errors=True)
+            return
+
+        self.evict()
+
+    # -------------------------------------------------------------
+    # Size bound
+    # -------------------------------------------------------------
+    def _entries(self):
+        """[(last use, size, path)] of every complete entry"""
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, name)
+            try:
+                used = os.path.getmtime(os.path.join(path, "result.json"))
+                size = sum(e.stat().st_size for e in os.scandir(path) if e.is_file())
+            except OSError:
+                continue
+            entries.append((used, size, path))
+        return entries
+
+    def evict(self):
+        """Delete least recently used entries until the cache fits in max_bytes"""
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+
+    def stats(self):
+        entries = self._entries()
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": len(entries),
+            "bytes": sum(size for _, size, _ in entries),
+            "max_bytes": self.max_bytes
+        }
@@ -0,0 +1,40 @@
+import re
+
+import numpy as np
+import pytest
+
+from app.models.conversion_options import ConversionOptions
+from app.pipeline.svg_to_gcode import SvgToGCode
+
+SVG = """<svg xmlns="http://www.w3.org/2000/svg" width="200" height="100">
+  <path d="M10 10 L100 10" fill="none" stroke="black"/>
+  <path d="M10 10 L100 10" fill="none" stroke="black"/>
+  <path d="M100 10 L10 10" fill="none" stroke="black"/>
+  <path d="M50 10 L150 10" fill="none" stroke="black"/>
+  <path d="M10 50 L100 50" fill="none" stroke="black"/>
+</svg>
+"""
+
+MOVE = re.compile(r"G1 X(-?[\d.]+) Y(-?[\d.]+)")
+
+
+def strokes(blocks):
+    """Each block's pen-down polyline as complex points"""
+    return [np.array([complex(float(x), float(y)) for x, y in MOVE.findall("\n".join(block))])
+            for block in blocks]
+
+
+@pytest.mark.parametrize("path_order", ["serpentine", "nearest"])
+def test_overlaps_removed_in_drawing_order(tmp_path, path_order):
+    svg_file = tmp_path / "overlap.svg"
+    svg_file.write_text(SVG)
+
+    options = ConversionOptions(overlap_tolerance=0.1, path_order=path_order, path_order_time=0)
+    converter = SvgToGCode(str(svg_file), output_file=None, options=options)
+    drawn = strokes(converter.program().blocks)
+
+    # Whichever of the first line and the partial overlap comes first is drawn
+    # whole and the other loses the shared stretch; both duplicates are gone
+    assert len(drawn) == 3
+    total = sum(float(np.abs(np.diff(points)).sum()) for points in drawn)
+    assert total == pytest.approx(140 + 90, abs=0.5)